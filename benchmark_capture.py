@@ -0,0 +1,172 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from capture_backend import CAPTURE_BACKENDS, create_capture_backend
+
+
+def parse_size(text):
+    """
+    Parse a WIDTHxHEIGHT region size.
+    """
+    try:
+        w, h = text.lower().split('x')
+        return int(w), int(h)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid region size '{text}', expected WIDTHxHEIGHT")
+
+
+def benchmark_backend(backend, sizes, frames, warmup=5):
+    """
+    Time backend.grab() for each region size and return (size, mean_ms, min_ms) rows.
+    """
+    rows = []
+    screen = backend.screen_size()
+    for w, h in sizes:
+        if screen is not None and (w > screen[0] or h > screen[1]):
+            # Off-screen parts are padded, not captured, so the timing would be misleading
+            print(f"Skipping {w}x{h} on '{backend.name}': larger than the {screen[0]}x{screen[1]} screen")
+            continue
+        for _ in range(warmup):
+            backend.grab(0, 0, w, h)
+        timings = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            backend.grab(0, 0, w, h)
+            timings.append(time.perf_counter() - start)
+        rows.append(((w, h), 1000 * sum(timings) / len(timings), 1000 * min(timings)))
+    return rows
+
+
+# Colours of the 4x4 test pattern cells, in BGR
+PATTERN_COLOURS = np.array([(b, g, 85) for b in (0, 85, 170, 255) for g in (0, 85, 170, 255)], dtype=np.uint8)
+
+
+def expected_pattern(screen_w, screen_h):
+    """
+    The test pattern as a BGR array: a 4x4 grid of distinct colours covering the screen.
+    """
+    cols = np.arange(screen_w) * 4 // screen_w
+    rows = np.arange(screen_h) * 4 // screen_h
+    return PATTERN_COLOURS[rows[:, None] * 4 + cols[None, :]]
+
+
+class PatternWindow(QtWidgets.QWidget):
+    """
+    Borderless window covering the screen with the test pattern.
+    """
+
+    def __init__(self, screen_w, screen_h):
+        super().__init__(None, QtCore.Qt.FramelessWindowHint | QtCore.Qt.X11BypassWindowManagerHint
+                         | QtCore.Qt.WindowStaysOnTopHint)
+        self.setGeometry(0, 0, screen_w, screen_h)
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        w, h = self.width(), self.height()
+        for index, (b, g, r) in enumerate(PATTERN_COLOURS):
+            row, col = divmod(index, 4)
+            x0, x1 = -(-col * w // 4), -(-(col + 1) * w // 4)
+            y0, y1 = -(-row * h // 4), -(-(row + 1) * h // 4)
+            painter.fillRect(x0, y0, x1 - x0, y1 - y0, QtGui.QColor(int(r), int(g), int(b)))
+
+
+def verify_backend(backend, screen_w, screen_h, tolerance=8):
+    """
+    Check grab() against the test pattern on screen: one region inside the
+    screen and one reaching past its bottom-right corner, which must come back
+    padded with black. Returns a list of failure messages.
+    """
+    expected = expected_pattern(screen_w, screen_h)
+    w, h = screen_w // 2, screen_h // 2
+    cases = [('inside', screen_w // 8, screen_h // 8)]
+    if backend.screen_rect() is not None:
+        cases.append(('off-screen', screen_w - w // 2, screen_h - h // 2))
+
+    failures = []
+    for label, x, y in cases:
+        want = np.zeros((h, w, 3), dtype=np.uint8)
+        visible = expected[y:y + h, x:x + w]
+        want[:visible.shape[0], :visible.shape[1]] = visible
+        got = backend.grab(x, y, w, h)
+        if got.shape != want.shape:
+            failures.append(f"{label}: got shape {got.shape}, expected {want.shape}")
+            continue
+        diff = np.abs(got.astype(np.int16) - want).max(axis=2)
+        bad = np.count_nonzero(diff > tolerance)
+        if bad:
+            failures.append(f"{label}: {bad} of {w * h} pixels differ from the pattern")
+    return failures
+
+
+def run_verify(app, names):
+    geometry = app.primaryScreen().geometry()
+    screen_w, screen_h = geometry.width(), geometry.height()
+    window = PatternWindow(screen_w, screen_h)
+    window.show()
+    deadline = time.monotonic() + 1.0
+    while time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.02)
+
+    failed = False
+    for name in names:
+        try:
+            backend = create_capture_backend(name)
+        except (ImportError, RuntimeError, OSError) as e:
+            print(f"{name:<8} unavailable: {e}")
+            continue
+        try:
+            failures = verify_backend(backend, screen_w, screen_h)
+        finally:
+            backend.close()
+        for failure in failures:
+            print(f"{name:<8} FAIL {failure}")
+        if not failures:
+            print(f"{name:<8} ok")
+        failed = failed or bool(failures)
+    window.close()
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure per-frame screen capture cost of each backend, or check its pixels with --verify. '
+                    'Runs headless under Xvfb, e.g. xvfb-run -s "-screen 0 1920x1080x24" python benchmark_capture.py'
+    )
+    parser.add_argument('--backends', nargs='+', default=list(CAPTURE_BACKENDS), choices=list(CAPTURE_BACKENDS),
+                        help='Backends to benchmark.')
+    parser.add_argument('--sizes', nargs='+', type=parse_size, default=[(320, 240), (800, 600), (1280, 720), (1920, 1080)],
+                        help='Region sizes as WIDTHxHEIGHT.')
+    parser.add_argument('--frames', type=int, default=100, help='Number of timed frames per region size.')
+    parser.add_argument('--verify', action='store_true',
+                        help='Instead of timing, check captured pixels against a test pattern drawn on screen '
+                             '(including a region reaching off-screen). Exits non-zero on mismatch.')
+
+    args = parser.parse_args()
+
+    # The Qt backend needs an application object even when nothing is shown
+    app = QtWidgets.QApplication(sys.argv[:1])
+
+    if args.verify:
+        sys.exit(0 if run_verify(app, args.backends) else 1)
+
+    print(f"{'backend':<8} {'region':>10} {'mean ms':>9} {'min ms':>9} {'fps':>8}")
+    for name in args.backends:
+        try:
+            backend = create_capture_backend(name)
+        except (ImportError, RuntimeError, OSError) as e:
+            print(f"{name:<8} unavailable: {e}")
+            continue
+        try:
+            for (w, h), mean_ms, min_ms in benchmark_backend(backend, args.sizes, args.frames):
+                print(f"{name:<8} {f'{w}x{h}':>10} {mean_ms:9.2f} {min_ms:9.2f} {1000 / mean_ms:8.1f}")
+        finally:
+            backend.close()
+
+
+if __name__ == '__main__':
+    main()
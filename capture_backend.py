@@ -0,0 +1,368 @@
+import ctypes
+import ctypes.util
+import os
+import sys
+
+import cv2
+import numpy as np
+
+
+class CaptureBackend:
+    """
+    Base class for screen capture backends.
+
+    grab() returns a BGR numpy array of the requested screen region. The array
+    may be a view into a buffer owned by the backend, so it is only valid until
+    the next call to grab(); copy it if it has to outlive the frame.
+
+    Regions are in device pixels unless device_pixels is False (Qt takes
+    logical, DPI-independent coordinates). Backends that know the screen size
+    capture only its visible part and pad the rest with black.
+    """
+    name = 'base'
+    device_pixels = True
+
+    def grab(self, x, y, w, h):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def screen_rect(self):
+        """
+        (left, top, width, height) of the capturable screen, or None if the backend does not know it.
+        """
+        return None
+
+    def screen_size(self):
+        """
+        (width, height) of the capturable screen, or None if the backend does not know it.
+        """
+        rect = self.screen_rect()
+        return rect[2:] if rect is not None else None
+
+    def _grab_clipped(self, x, y, w, h, grab_visible):
+        """
+        Capture only the on-screen part of a region and pad the rest with black.
+        grab_visible(x, y, w, h, dst) writes that part of the screen into dst as BGR.
+        """
+        bgr = self._bgr_buffer(w, h)
+        rect = self.screen_rect()
+        if rect is None:
+            visible = (x, y, w, h)
+        else:
+            left, top, screen_w, screen_h = rect
+            visible = clip_region(x - left, y - top, w, h, screen_w, screen_h)
+            if visible is not None:
+                visible = (visible[0] + left, visible[1] + top, visible[2], visible[3])
+        if visible is None:
+            bgr.fill(0)
+            return bgr
+        vx, vy, vw, vh = visible
+        if (vw, vh) == (w, h):
+            grab_visible(vx, vy, vw, vh, bgr)
+            return bgr
+        bgr.fill(0)
+        ox, oy = vx - x, vy - y
+        grab_visible(vx, vy, vw, vh, bgr[oy:oy + vh, ox:ox + vw])
+        return bgr
+
+    def _bgr_buffer(self, w, h):
+        # Reuse the output buffer as long as the region size does not change
+        if self._bgr is None or self._bgr.shape[:2] != (h, w):
+            self._bgr = np.empty((h, w, 3), dtype=np.uint8)
+        return self._bgr
+
+
+class QtCaptureBackend(CaptureBackend):
+    """
+    Capture through QScreen.grabWindow (portable, but copies through a QPixmap).
+    Requires a running QApplication.
+    """
+    name = 'qt'
+    device_pixels = False
+
+    def __init__(self):
+        from PyQt5 import QtGui, QtWidgets
+        self._QtGui = QtGui
+        self._QtWidgets = QtWidgets
+        if QtWidgets.QApplication.instance() is None:
+            raise RuntimeError("QtCaptureBackend requires a QApplication")
+        self._bgr = None
+
+    def grab(self, x, y, w, h):
+        screen = self._QtWidgets.QApplication.primaryScreen()
+        pixmap = screen.grabWindow(0, x, y, w, h)
+        image = pixmap.toImage().convertToFormat(self._QtGui.QImage.Format_RGB32)
+
+        # Format_RGB32 is stored as BGRA on little-endian machines
+        h, w = image.height(), image.width()
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        bgra = np.frombuffer(bits, dtype=np.uint8).reshape(h, image.bytesPerLine())[:, :w * 4].reshape(h, w, 4)
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=self._bgr_buffer(w, h))
+
+
+class MssCaptureBackend(CaptureBackend):
+    """
+    Region grab through the mss library, converted into a reusable buffer.
+    """
+    name = 'mss'
+
+    def __init__(self):
+        import mss
+        import mss.exception
+        try:
+            self._sct = mss.mss()
+        except mss.exception.ScreenShotError as e:
+            raise RuntimeError(f"mss cannot open the screen: {e}") from e
+        self._bgr = None
+
+    def screen_rect(self):
+        # Monitor 0 is the bounding box of all monitors
+        monitor = self._sct.monitors[0]
+        return monitor['left'], monitor['top'], monitor['width'], monitor['height']
+
+    def grab(self, x, y, w, h):
+        # XGetImage fails with ScreenShotError for regions reaching past the screen
+        return self._grab_clipped(x, y, w, h, self._grab_visible)
+
+    def _grab_visible(self, x, y, w, h, dst):
+        shot = self._sct.grab({'left': x, 'top': y, 'width': w, 'height': h})
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=dst)
+
+    def close(self):
+        self._sct.close()
+
+
+def clip_region(x, y, w, h, screen_w, screen_h):
+    """
+    Intersect a region with the screen. Returns the visible (x, y, w, h), or
+    None when the region lies entirely off-screen.
+    """
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + w, screen_w), min(y + h, screen_h)
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right - left, bottom - top
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong),
+        ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p),
+        ('readOnly', ctypes.c_int),
+    ]
+
+
+class _XImage(ctypes.Structure):
+    # Only the leading fields of XImage are declared; we never allocate one ourselves
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+    ]
+
+
+class XShmCaptureBackend(CaptureBackend):
+    """
+    Linux/X11 capture using the MIT-SHM extension.
+
+    The X server writes pixels straight into a System V shared memory segment
+    that is mapped as a numpy array, so a grab costs one server-side copy and a
+    colour conversion into a reusable buffer. The segment is only reallocated
+    when the region size changes.
+    """
+    name = 'xshm'
+
+    _ZPixmap = 2
+    _AllPlanes = 0xFFFFFFFF
+    _IPC_PRIVATE = 0
+    _IPC_CREAT = 0o1000
+    _IPC_RMID = 0
+
+    def __init__(self, display_name=None):
+        if not sys.platform.startswith('linux'):
+            raise RuntimeError("XShmCaptureBackend is only available on Linux")
+        display_name = display_name or os.environ.get('DISPLAY')
+        if not display_name:
+            raise RuntimeError("XShmCaptureBackend requires an X11 display (DISPLAY is not set)")
+
+        x11_path = ctypes.util.find_library('X11')
+        xext_path = ctypes.util.find_library('Xext')
+        if not x11_path or not xext_path:
+            raise RuntimeError("XShmCaptureBackend requires libX11 and libXext")
+        self._x11 = ctypes.CDLL(x11_path)
+        self._xext = ctypes.CDLL(xext_path)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._declare_prototypes()
+
+        self._display = self._x11.XOpenDisplay(display_name.encode())
+        if not self._display:
+            raise RuntimeError(f"Unable to open X display {display_name}")
+        if not self._xext.XShmQueryExtension(self._display):
+            self._x11.XCloseDisplay(self._display)
+            raise RuntimeError("X server does not support the MIT-SHM extension")
+
+        screen = self._x11.XDefaultScreen(self._display)
+        self._root = self._x11.XRootWindow(self._display, screen)
+        self._visual = self._x11.XDefaultVisual(self._display, screen)
+        self._depth = self._x11.XDefaultDepth(self._display, screen)
+        self._screen_w = self._x11.XDisplayWidth(self._display, screen)
+        self._screen_h = self._x11.XDisplayHeight(self._display, screen)
+
+        self._shminfo = _XShmSegmentInfo()
+        self._ximage = None
+        self._bgra = None
+        self._size = None
+        self._bgr = None
+
+    def _declare_prototypes(self):
+        x11, xext, libc = self._x11, self._xext, self._libc
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XRootWindow.restype = ctypes.c_ulong
+        x11.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+            ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint,
+        ]
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage), ctypes.c_int, ctypes.c_int, ctypes.c_ulong,
+        ]
+
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+    def _allocate(self, w, h):
+        """
+        (Re)create the shared XImage for a region of the given size.
+        """
+        self._release()
+
+        ximage = self._xext.XShmCreateImage(
+            self._display, self._visual, self._depth, self._ZPixmap, None, ctypes.byref(self._shminfo), w, h
+        )
+        if not ximage:
+            raise RuntimeError("XShmCreateImage failed")
+        image = ximage.contents
+        if image.bits_per_pixel != 32:
+            self._x11.XDestroyImage(ximage)
+            raise RuntimeError(f"Unsupported X visual: {image.bits_per_pixel} bits per pixel")
+
+        size = image.bytes_per_line * image.height
+        shmid = self._libc.shmget(self._IPC_PRIVATE, size, self._IPC_CREAT | 0o600)
+        if shmid < 0:
+            self._x11.XDestroyImage(ximage)
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        shmaddr = self._libc.shmat(shmid, None, 0)
+        if shmaddr in (None, ctypes.c_void_p(-1).value):
+            self._libc.shmctl(shmid, self._IPC_RMID, None)
+            self._x11.XDestroyImage(ximage)
+            raise OSError(ctypes.get_errno(), "shmat failed")
+
+        self._shminfo.shmid = shmid
+        self._shminfo.shmaddr = shmaddr
+        self._shminfo.readOnly = 0
+        image.data = shmaddr
+        self._xext.XShmAttach(self._display, ctypes.byref(self._shminfo))
+        self._x11.XSync(self._display, 0)
+        # Mark the segment for removal now; it is freed once both sides detach
+        self._libc.shmctl(shmid, self._IPC_RMID, None)
+
+        raw = (ctypes.c_ubyte * size).from_address(shmaddr)
+        rows = np.ctypeslib.as_array(raw).reshape(image.height, image.bytes_per_line)
+        self._bgra = rows[:, :w * 4].reshape(h, w, 4)
+        self._ximage = ximage
+        self._size = (w, h)
+
+    def _release(self):
+        if self._ximage is None:
+            return
+        self._xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+        self._x11.XSync(self._display, 0)
+        # Data lives in the shm segment, so keep XDestroyImage from free()ing it
+        self._ximage.contents.data = None
+        self._x11.XDestroyImage(self._ximage)
+        self._libc.shmdt(self._shminfo.shmaddr)
+        self._ximage = None
+        self._bgra = None
+        self._size = None
+
+    def screen_rect(self):
+        return 0, 0, self._screen_w, self._screen_h
+
+    def grab(self, x, y, w, h):
+        # XShmGetImage on a region reaching past the root window is a BadMatch, and
+        # Xlib's default error handler exits the process
+        return self._grab_clipped(x, y, w, h, self._grab_visible)
+
+    def _grab_visible(self, x, y, w, h, dst):
+        if self._size != (w, h):
+            self._allocate(w, h)
+        if not self._xext.XShmGetImage(self._display, self._root, self._ximage, x, y, self._AllPlanes):
+            raise RuntimeError(f"XShmGetImage failed for region {w}x{h}+{x}+{y}")
+        cv2.cvtColor(self._bgra, cv2.COLOR_BGRA2BGR, dst=dst)
+
+    def close(self):
+        self._release()
+        if self._display:
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+
+
+CAPTURE_BACKENDS = {
+    'xshm': XShmCaptureBackend,
+    'mss': MssCaptureBackend,
+    'qt': QtCaptureBackend,
+}
+
+
+def create_capture_backend(name='auto'):
+    """
+    Create a capture backend by name. 'auto' tries the fastest backend available
+    on this platform and falls back to Qt.
+    """
+    if name != 'auto':
+        if name not in CAPTURE_BACKENDS:
+            raise ValueError(f"Unknown capture backend '{name}'. Choose from: auto, {', '.join(CAPTURE_BACKENDS)}")
+        return CAPTURE_BACKENDS[name]()
+
+    candidates = ['xshm', 'mss', 'qt'] if sys.platform.startswith('linux') else ['mss', 'qt']
+    for candidate in candidates:
+        try:
+            backend = CAPTURE_BACKENDS[candidate]()
+        except (ImportError, RuntimeError, OSError) as e:
+            print(f"Capture backend '{candidate}' unavailable: {e}")
+            continue
+        print(f"Using capture backend '{candidate}'")
+        return backend
+    raise RuntimeError("No capture backend available")
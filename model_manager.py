@@ -0,0 +1,363 @@
+import argparse
+import collections
+import ctypes
+import ctypes.util
+import gc
+import os
+import sys
+import threading
+import time
+
+import cv2
+
+from ocr_results import OCRResult, parse_paddleocr_results
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes, from /proc/self/statm
+    (falling back to psutil where /proc is not available, else 0).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return 0
+
+
+def _release_memory():
+    # Freed model tensors mostly stay in the allocator's arenas; ask glibc to hand them back
+    gc.collect()
+    libc_name = ctypes.util.find_library('c')
+    if libc_name and sys.platform.startswith('linux'):
+        try:
+            ctypes.CDLL(libc_name).malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+def worker_cpu_threads(workers):
+    """
+    CPU threads each of `workers` OCR processes may use without oversubscribing the machine.
+    """
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def limit_threads(cpu_threads):
+    """
+    Cap the threads OpenCV and the OCR libraries start in this process, for
+    worker processes that share the CPU with others. Call before loading a model.
+    """
+    # Each worker already owns a core; OpenCV's own pool only adds contention
+    cv2.setNumThreads(1)
+    os.environ['OMP_NUM_THREADS'] = str(cpu_threads)
+    # Read by the tesseract binary, which inherits this environment
+    os.environ['OMP_THREAD_LIMIT'] = str(cpu_threads)
+
+
+def _to_rgb(image):
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+# Server-size PP-OCRv4 text detector (language independent), downloaded by PaddleOCR
+# on first use. Set PADDLE_SERVER_DET_MODEL to a local model directory (or another
+# model URL) to use that instead.
+PADDLE_SERVER_DET_MODEL = os.environ.get(
+    'PADDLE_SERVER_DET_MODEL',
+    'https://paddleocr.bj.bcebos.com/PP-OCRv4/chinese/ch_PP-OCRv4_det_server_infer.tar',
+)
+
+
+def _load_paddle(tier, cpu_threads=None):
+    from paddleocr import PaddleOCR
+    options = {'cpu_threads': cpu_threads} if cpu_threads else {}
+    if tier == 'lite':
+        # PP-OCRv3 mobile detector and Japanese recognizer only, on a smaller detector input
+        model = PaddleOCR(lang='japan', ocr_version='PP-OCRv3', use_angle_cls=False, det_limit_side_len=736,
+                          show_log=False, **options)
+        cls = False
+    else:
+        # Server detector plus angle classifier; Japanese has no server recognizer, so that stays mobile
+        model = PaddleOCR(lang='japan', det_model_dir=PADDLE_SERVER_DET_MODEL, use_angle_cls=True,
+                          det_limit_side_len=1536, show_log=False, **options)
+        cls = True
+    return lambda image: parse_paddleocr_results(model.ocr(_to_rgb(image), rec=True, cls=cls))
+
+
+def _load_tesseract(tier, cpu_threads=None):
+    import pytesseract
+    from PIL import Image
+    # Tesseract runs out of process, so its traineddata never counts towards this RSS;
+    # its threads are capped through OMP_THREAD_LIMIT (see limit_threads)
+    if tier == 'lite':
+        lang, config = 'jpn', ''
+    else:
+        # Horizontal and vertical Japanese together: better on mixed layouts, slower
+        lang, config = 'jpn+jpn_vert', '--oem 1'
+    return lambda image: OCRResult.from_text(
+        pytesseract.image_to_string(Image.fromarray(_to_rgb(image)), lang=lang, config=config)
+    )
+
+
+def _load_manga(tier, cpu_threads=None):
+    from manga_ocr import MangaOcr
+    from PIL import Image
+    if cpu_threads:
+        import torch
+        torch.set_num_threads(cpu_threads)
+    if tier == 'lite':
+        import torch
+        model = MangaOcr(force_cpu=True)
+        # int8 weights for the linear layers: roughly a quarter of the memory, slightly lower accuracy
+        model.model = torch.quantization.quantize_dynamic(model.model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        model = MangaOcr()
+    return lambda image: OCRResult.from_text(model(Image.fromarray(_to_rgb(image))))
+
+
+# engine -> loader(tier, cpu_threads=None) returning an OCR callable: grayscale or BGR image -> OCRResult
+ENGINES = {
+    'paddle': _load_paddle,
+    'tesseract': _load_tesseract,
+    'manga': _load_manga,
+}
+
+TIERS = ('lite', 'server')
+
+
+class _LoadedModel:
+    __slots__ = ('ocr', 'rss_bytes', 'last_used', 'busy')
+
+    def __init__(self, ocr, rss_bytes):
+        self.ocr = ocr
+        self.rss_bytes = rss_bytes
+        self.last_used = time.monotonic()
+        self.busy = 0
+
+
+class _TierStats:
+    __slots__ = ('loads', 'load_s', 'rss_bytes', 'calls', 'total_s', 'max_s')
+
+    def __init__(self):
+        self.loads = 0
+        self.load_s = 0.0
+        self.rss_bytes = 0
+        self.calls = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+
+
+class ModelManager:
+    """
+    Loads OCR models on demand and keeps the process under an RSS budget.
+
+    Models are keyed by (engine, tier). A model that has not been used for
+    idle_ttl seconds is unloaded by unload_idle() (also run on every ocr()
+    call) and loaded again the next time it is needed. Before a model is
+    loaded, least recently used models are unloaded until its last measured
+    size fits in budget_mb; a model that is running OCR is never unloaded.
+
+    Memory is measured as the RSS growth while a model loads, so the figures
+    in report() are only exact when models are loaded one at a time.
+    """
+
+    def __init__(self, budget_mb=None, idle_ttl=300.0, default_tier='lite'):
+        if default_tier not in TIERS:
+            raise ValueError(f"tier must be one of: {', '.join(TIERS)}")
+        self.budget_bytes = int(budget_mb * 1024 * 1024) if budget_mb else None
+        self.idle_ttl = idle_ttl
+        self.default_tier = default_tier
+
+        self._models = collections.OrderedDict()
+        self._stats = collections.defaultdict(_TierStats)
+        self._lock = threading.RLock()
+
+    def ocr(self, engine, image, tier=None):
+        """
+        Run OCR with the given engine and tier, loading the model if needed.
+        """
+        key = (engine, tier or self.default_tier)
+        self.unload_idle()
+        with self._lock:
+            model = self._acquire(key)
+            model.busy += 1
+        start = time.perf_counter()
+        try:
+            return model.ocr(image)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                model.busy -= 1
+                model.last_used = time.monotonic()
+                stats = self._stats[key]
+                stats.calls += 1
+                stats.total_s += elapsed
+                stats.max_s = max(stats.max_s, elapsed)
+
+    def load(self, engine, tier=None):
+        """
+        Load a model ahead of time (e.g. at startup) without running it.
+        """
+        with self._lock:
+            self._acquire((engine, tier or self.default_tier))
+
+    def unload(self, engine, tier=None):
+        """
+        Unload a model now unless it is running OCR. Returns True if it was unloaded.
+        """
+        key = (engine, tier or self.default_tier)
+        with self._lock:
+            if key not in self._models or self._models[key].busy:
+                return False
+            del self._models[key]
+            _release_memory()
+            return True
+
+    def unload_idle(self):
+        """
+        Unload every model unused for longer than idle_ttl. Returns the keys unloaded.
+        """
+        if self.idle_ttl is None:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                key for key, model in self._models.items()
+                if not model.busy and now - model.last_used > self.idle_ttl
+            ]
+            for key in expired:
+                del self._models[key]
+        if expired:
+            _release_memory()
+            print(f"Unloaded idle models: {', '.join('/'.join(key) for key in expired)}")
+        return expired
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
+
+    def _acquire(self, key):
+        model = self._models.get(key)
+        if model is not None:
+            self._models.move_to_end(key)
+            return model
+
+        engine, tier = key
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown OCR engine '{engine}'. Choose from: {', '.join(ENGINES)}")
+        if tier not in TIERS:
+            raise ValueError(f"Unknown model tier '{tier}'. Choose from: {', '.join(TIERS)}")
+
+        # Size measured the last time this tier was loaded, if any
+        self._make_room(self._stats[key].rss_bytes if key in self._stats else 0)
+        before = current_rss()
+        start = time.perf_counter()
+        ocr = ENGINES[engine](tier)
+        load_s = time.perf_counter() - start
+        rss_bytes = max(current_rss() - before, 0)
+
+        stats = self._stats[key]
+        stats.loads += 1
+        stats.load_s = load_s
+        stats.rss_bytes = rss_bytes
+        model = self._models[key] = _LoadedModel(ocr, rss_bytes)
+
+        # The first load of a tier has no size estimate; trim afterwards instead
+        self._make_room(0, keep=key)
+        return model
+
+    def _make_room(self, needed, keep=None):
+        # Unload least recently used models until `needed` more bytes fit in the budget
+        if self.budget_bytes is None:
+            return
+        evicted = []
+        for key in list(self._models):
+            if current_rss() + needed <= self.budget_bytes:
+                break
+            if key == keep or self._models[key].busy:
+                continue
+            del self._models[key]
+            evicted.append(key)
+            _release_memory()
+        if evicted:
+            print(f"Unloaded models to stay within {self.budget_bytes / 1024 / 1024:.0f} MB: "
+                  f"{', '.join('/'.join(key) for key in evicted)}")
+
+    def report(self):
+        """
+        Per (engine, tier): whether it is loaded, its RSS cost in MB, its last
+        load time and its OCR latency (mean and max, in ms).
+        """
+        with self._lock:
+            rows = []
+            for (engine, tier), stats in sorted(self._stats.items()):
+                rows.append({
+                    'engine': engine,
+                    'tier': tier,
+                    'loaded': (engine, tier) in self._models,
+                    'rss_mb': stats.rss_bytes / 1024 / 1024,
+                    'loads': stats.loads,
+                    'load_s': stats.load_s,
+                    'calls': stats.calls,
+                    'mean_ms': stats.total_s / stats.calls * 1000 if stats.calls else 0.0,
+                    'max_ms': stats.max_s * 1000,
+                })
+            return rows
+
+    def format_report(self):
+        lines = [f"{'engine':<10} {'tier':<7} {'loaded':>6} {'RSS MB':>8} {'loads':>5} "
+                 f"{'load s':>7} {'calls':>6} {'mean ms':>8} {'max ms':>8}"]
+        for row in self.report():
+            lines.append(
+                f"{row['engine']:<10} {row['tier']:<7} {'yes' if row['loaded'] else 'no':>6} {row['rss_mb']:8.1f} "
+                f"{row['loads']:>5} {row['load_s']:7.2f} {row['calls']:>6} {row['mean_ms']:8.1f} {row['max_ms']:8.1f}"
+            )
+        lines.append(f"Process RSS: {current_rss() / 1024 / 1024:.1f} MB")
+        return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the memory and OCR latency of each model tier.')
+    parser.add_argument('image_path', type=str, help='Image to run OCR on.')
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES), help='Engines to measure.')
+    parser.add_argument('--tiers', nargs='+', choices=TIERS, default=list(TIERS), help='Model tiers to measure.')
+    parser.add_argument('--runs', type=int, default=5, help='OCR calls per tier after loading.')
+
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image_path)
+    if image is None:
+        print(f"Error: Unable to load image at {args.image_path}")
+        sys.exit(1)
+
+    # One model at a time, so each RSS delta belongs to a single tier
+    manager = ModelManager(idle_ttl=None)
+    for engine in args.engines:
+        for tier in args.tiers:
+            print(f"Measuring {engine}/{tier}...")
+            try:
+                manager.load(engine, tier)
+                for _ in range(args.runs):
+                    manager.ocr(engine, image, tier)
+            except Exception as e:
+                print(f"Error running {engine}/{tier}: {e}")
+            manager.unload(engine, tier)
+
+    print()
+    print(manager.format_report())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,15 @@
+import argparse
 import sys
 from PyQt5 import QtCore, QtGui, QtWidgets
+import pytesseract
 from deep_translator import GoogleTranslator
-import io
 from PIL import Image
 
+from capture_backend import CAPTURE_BACKENDS, create_capture_backend
+from ocr_results import OCRResult, SessionHistory
+
 class ScreenshotWindow(QtWidgets.QWidget):
-    def __init__(self):
+    def __init__(self, capture_backend='auto'):
         super().__init__()
 
         self.initUI()
@@ -20,6 +24,12 @@ class ScreenshotWindow(QtWidgets.QWidget):
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.capture_screenshot)
 
+        # Screen capture backend, chosen once at startup
+        self.capture_backend = create_capture_backend(capture_backend)
+
+        # Recognised text of this session
+        self.history = SessionHistory()
+
 
     def initUI(self):
         self.setWindowTitle('Screenshot Tool')
@@ -76,10 +86,13 @@ class ScreenshotWindow(QtWidgets.QWidget):
         y = self.y()
         w = self.width()
         h = self.height()
+        if self.capture_backend.device_pixels:
+            # Native backends work in device pixels; widget geometry is logical under high-DPI scaling
+            ratio = self.devicePixelRatioF()
+            x, y, w, h = (round(v * ratio) for v in (x, y, w, h))
 
         # Grab the area of the screen under the window
-        screen = QtWidgets.QApplication.primaryScreen()
-        screenshot = screen.grabWindow(0, x, y, w, h)
+        screenshot = self.capture_backend.grab(x, y, w, h)
 
         # Translate the screenshot
         self.process_screenshot(screenshot)
@@ -209,22 +222,25 @@ class ScreenshotWindow(QtWidgets.QWidget):
         # print("Mouse released, cursor reset to ArrowCursor")
 
     def process_screenshot(self, screenshot):
-        # Convert QPixmap to PIL Image
-        buffer = QtCore.QBuffer()
-        buffer.open(QtCore.QBuffer.ReadWrite)
-        screenshot.save(buffer, 'PNG')
-        pil_im = Image.open(io.BytesIO(buffer.data()))
+        # Convert the BGR frame to PIL Image
+        pil_im = Image.fromarray(screenshot[:, :, ::-1])
 
         # Extract text from the image using OCR
-        extracted_text = pytesseract.image_to_string(pil_im)
+        result = OCRResult.from_text(pytesseract.image_to_string(pil_im))
 
         # Only print if the text has changed
-        if extracted_text.strip() and extracted_text.strip() != self.previous_text:
-            self.previous_text = extracted_text.strip()  # Update the previous text
-            print("Detected Text:", self.previous_text)
+        previous = self.history.latest()
+        if result.lines and (previous is None or result.text != previous.text):
+            self.history.append(result)
+            print("Detected Text:", result.text)
 
 if __name__ == '__main__':
-    app = QtWidgets.QApplication(sys.argv)
-    window = ScreenshotWindow()
+    parser = argparse.ArgumentParser(description='Screen region overlay for continuous OCR.')
+    parser.add_argument('--capture-backend', default='auto', choices=['auto'] + list(CAPTURE_BACKENDS),
+                        help='Screen capture backend to use.')
+    args, qt_args = parser.parse_known_args()
+
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    window = ScreenshotWindow(capture_backend=args.capture_backend)
     window.show()
     sys.exit(app.exec_())
@@ -1,9 +1,15 @@
+import argparse
 import sys
 from PyQt5 import QtCore, QtGui, QtWidgets
 import pytesseract
-from deep_translator import GoogleTranslator
-import io
-from PIL import Image
+
+from capture_backend import CAPTURE_BACKENDS, create_capture_backend
+from model_manager import ENGINES, TIERS, ModelManager
+from ocr_results import SessionHistory
+from overlay_pipeline import OverlayPipeline
+from session_recorder import SessionRecorder
+from translation_queue import TranslationQueue, upcoming_lines
+from translation_server import TranslationServer
 
 # Set the path to Tesseract executable
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
@@ -36,7 +42,11 @@ class TranslationWindow(QtWidgets.QWidget):
         self.text_edit.setText(text)
 
 class ScreenshotWindow(QtWidgets.QWidget):
-    def __init__(self):
+    # Emitted from a translation thread when a queued translation is ready
+    translation_ready = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, capture_backend='auto', history=None, recorder=None, ocr_pool=None, server=None,
+                 async_translation=True, script_lines=None, model_manager=None, ocr_engine='tesseract'):
         super().__init__()
 
         self.initUI()
@@ -51,6 +61,41 @@ class ScreenshotWindow(QtWidgets.QWidget):
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.capture_screenshot)
 
+        # Screen capture backend, chosen once at startup
+        self.capture_backend = create_capture_backend(capture_backend)
+
+        # OCR and translation of captured frames
+        self.pipeline = OverlayPipeline(history=history)
+
+        # OCR models are loaded on demand and unloaded again after sitting idle
+        self.model_manager = model_manager
+        self.idle_timer = QtCore.QTimer()
+        if model_manager is not None:
+            self.pipeline.ocr = lambda frame: model_manager.ocr(ocr_engine, frame)
+            self.idle_timer.timeout.connect(model_manager.unload_idle)
+            self.idle_timer.start(30000)
+
+        # Translate in the background so the newest text is never stuck behind older lines
+        self.translation_queue = None
+        if async_translation:
+            self.translation_queue = TranslationQueue(self.pipeline.translator, self.on_translation)
+            self.pipeline.translation_queue = self.translation_queue
+            self.translation_ready.connect(self.apply_translation)
+
+        # Optional script of known lines, used to pre-translate upcoming ones
+        self.script_lines = script_lines
+
+        # Optional recorder for replaying this session later
+        self.recorder = recorder
+
+        # Optional pool of OCR worker processes; results are collected by a second timer
+        self.ocr_pool = ocr_pool
+        self.result_timer = QtCore.QTimer()
+        self.result_timer.timeout.connect(self.collect_results)
+
+        # Optional server publishing each translation to other consumers
+        self.server = server
+
         # Translation window
         self.translation_window = TranslationWindow()
         self.translation_window.show()
@@ -87,9 +132,12 @@ class ScreenshotWindow(QtWidgets.QWidget):
             self.capture_button.setText('Stop')
             # Start the timer with an interval (e.g., every 1 second)
             self.timer.start(100)
+            if self.ocr_pool is not None:
+                self.result_timer.start(20)
         else:
             self.capture_button.setText('Start')
             self.timer.stop()
+            self.result_timer.stop()
 
     def capture_screenshot(self):
         # Bring the window to the top
@@ -100,13 +148,28 @@ class ScreenshotWindow(QtWidgets.QWidget):
         y = self.y()
         w = self.width()
         h = self.height()
+        if self.capture_backend.device_pixels:
+            # Native backends work in device pixels; widget geometry is logical under high-DPI scaling
+            ratio = self.devicePixelRatioF()
+            x, y, w, h = (round(v * ratio) for v in (x, y, w, h))
 
         # Grab the area of the screen under the window
-        screen = QtWidgets.QApplication.primaryScreen()
-        screenshot = screen.grabWindow(0, x, y, w, h)
+        screenshot = self.capture_backend.grab(x, y, w, h)
+        if self.recorder is not None:
+            self.recorder.record(screenshot, (x, y, w, h))
 
         # Translate the screenshot
-        self.translate(screenshot)
+        if self.ocr_pool is not None and not self.ocr_pool.alive():
+            print("All OCR workers have exited; running OCR in the UI process instead")
+            self.collect_results()
+            self.ocr_pool.close()
+            self.ocr_pool = None
+            self.result_timer.stop()
+        if self.ocr_pool is not None:
+            # Drop the frame if every worker slot is still busy
+            self.ocr_pool.submit(screenshot, block=False)
+        else:
+            self.translate(screenshot)
 
     def paintEvent(self, event):
         # Draw a semi-transparent rectangle to represent the window
@@ -220,30 +283,113 @@ class ScreenshotWindow(QtWidgets.QWidget):
         self.setCursor(QtCore.Qt.ArrowCursor)
 
     def translate(self, screenshot):
-        # Convert QPixmap to PIL Image
-        buffer = QtCore.QBuffer()
-        buffer.open(QtCore.QBuffer.ReadWrite)
-        screenshot.save(buffer, 'PNG')
-        pil_im = Image.open(io.BytesIO(buffer.data()))
-
-        # Extract text from the image
-        extracted_text = pytesseract.image_to_string(pil_im, lang='jpn')
-
-        if extracted_text.strip():
-            print("Extracted Text:", extracted_text)
-
-            # Translate the extracted text to English
-            translated_text = GoogleTranslator(source='auto', target='en').translate(extracted_text)
-            # print("Translated Text:", translated_text)
+        # Extract and translate the text, skipping frames whose text is unchanged
+        self.show_result(self.pipeline.process(screenshot))
+
+    def collect_results(self):
+        # Translate OCR results from the worker pool in frame order
+        for result in self.ocr_pool.poll():
+            self.show_result(self.pipeline.process_result(result))
+
+    def on_translation(self, text, translation, result):
+        # Called from a translation thread; hand the result over to the UI thread
+        self.translation_ready.emit(result, translation)
+
+    def apply_translation(self, result, translation):
+        self.pipeline.set_translation(result, translation)
+        # The signal is queued, so newer text may have been captured (and shown) since
+        if result is not self.pipeline.history.latest():
+            return
+        self.show_result(result)
+
+    def show_result(self, result):
+        if result is not None and result.translation is None:
+            # Queued for translation; shown once on_translation delivers it
+            print("Extracted Text:", result.text)
+        elif result is not None:
+            if self.translation_queue is None:
+                print("Extracted Text:", result.text)
+            # print("Translated Text:", result.translation)
             # Update the translation window
-            self.translation_window.update_text(translated_text)
+            self.translation_window.update_text(result.translation)
             self.translation_window.raise_()  # Bring the translation window to front
+            if self.server is not None:
+                self.server.publish(result.text, result.translation)
+            if self.translation_queue is not None and self.script_lines:
+                self.translation_queue.prefetch(upcoming_lines(self.script_lines, result.text))
         # else:
         #     print("No text detected.")
         #     self.translation_window.update_text('No text detected.')
 
 if __name__ == '__main__':
-    app = QtWidgets.QApplication(sys.argv)
-    window = ScreenshotWindow()
+    parser = argparse.ArgumentParser(description='Screen region overlay for continuous OCR.')
+    parser.add_argument('--capture-backend', default='auto', choices=['auto'] + list(CAPTURE_BACKENDS),
+                        help='Screen capture backend to use.')
+    parser.add_argument('--history-mb', type=float, default=16, help='Memory cap for the session history in MB.')
+    parser.add_argument('--history-spill', type=str, help='JSON lines file that receives history entries evicted from memory.')
+    parser.add_argument('--record', type=str, help='Directory to record captured frames into for later replay.')
+    parser.add_argument('--ocr-workers', type=int, default=0, help='Run OCR in this many worker processes instead of the UI process.')
+    parser.add_argument('--serve-port', type=int, help='Publish translations over SSE/WebSocket on this local port.')
+    parser.add_argument('--sync-translate', action='store_true', help='Translate in the UI thread instead of the background queue.')
+    parser.add_argument('--script', type=str, help='Text file of expected lines (one per line) to pre-translate while idle.')
+    parser.add_argument('--ocr-engine', choices=list(ENGINES),
+                        help='OCR engine (default: tesseract in the UI process, paddle in worker processes).')
+    parser.add_argument('--model-tier', default='lite', choices=TIERS, help='Model size: lite for small machines, server for accuracy.')
+    parser.add_argument('--model-budget-mb', type=float,
+                        help='RSS budget in MB for models in the UI process; least recently used models are unloaded to stay within it.')
+    parser.add_argument('--model-idle-ttl', type=float, default=300, help='Unload a model after it has been idle for this many seconds.')
+    args, qt_args = parser.parse_known_args()
+
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    history = SessionHistory(max_bytes=int(args.history_mb * 1024 * 1024), spill_path=args.history_spill)
+    recorder = None
+    if args.record:
+        try:
+            recorder = SessionRecorder(args.record)
+        except FileExistsError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    ocr_pool = None
+    if args.ocr_workers:
+        # Imported here so the default Tesseract mode does not pull in PaddleOCR
+        from ocr_workers import DEFAULT_SLOT_BYTES, OCRWorkerPool
+        # Size frame slots so a window covering every screen (in device pixels) still fits
+        screen = app.primaryScreen()
+        desktop = screen.virtualGeometry()
+        ratio = screen.devicePixelRatio()
+        slot_bytes = max(int(desktop.width() * ratio) * int(desktop.height() * ratio) * 3, DEFAULT_SLOT_BYTES)
+        try:
+            ocr_pool = OCRWorkerPool(args.ocr_workers, slot_bytes=slot_bytes, engine=args.ocr_engine or 'paddle',
+                                     tier=args.model_tier).start()
+        except RuntimeError as e:
+            print(f"Error starting OCR workers: {e}")
+            print("Running OCR in the UI process instead")
+    server = None
+    if args.serve_port:
+        try:
+            server = TranslationServer(port=args.serve_port).start()
+        except OSError as e:
+            print(f"Error: Unable to serve translations on port {args.serve_port}: {e}")
+            sys.exit(1)
+    model_manager = ModelManager(budget_mb=args.model_budget_mb, idle_ttl=args.model_idle_ttl, default_tier=args.model_tier)
+    script_lines = None
+    if args.script:
+        with open(args.script, encoding='utf-8') as f:
+            script_lines = [line.strip() for line in f if line.strip()]
+    window = ScreenshotWindow(capture_backend=args.capture_backend, history=history, recorder=recorder,
+                              ocr_pool=ocr_pool, server=server, async_translation=not args.sync_translate,
+                              script_lines=script_lines, model_manager=model_manager, ocr_engine=args.ocr_engine or 'tesseract')
     window.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    if window.translation_queue is not None:
+        window.translation_queue.close()
+        mean_latency, max_latency = window.translation_queue.latency_summary()
+        print(f"Translation latency: mean {mean_latency * 1000:.0f} ms, max {max_latency * 1000:.0f} ms")
+    print(model_manager.format_report())
+    if server is not None:
+        server.stop()
+    if ocr_pool is not None:
+        ocr_pool.close()
+    if recorder is not None:
+        recorder.close()
+    sys.exit(exit_code)
@@ -0,0 +1,211 @@
+import collections
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+
+class OCRLine:
+    """
+    A single recognised line. The bounding box lives in the owning
+    OCRResult.boxes array at row box_index (-1 when the engine gave no box).
+    """
+    __slots__ = ('text', 'confidence', 'box_index')
+
+    def __init__(self, text, confidence=1.0, box_index=-1):
+        self.text = sys.intern(text)
+        self.confidence = float(confidence)
+        self.box_index = box_index
+
+    def __repr__(self):
+        return f"OCRLine({self.text!r}, confidence={self.confidence:.3f}, box_index={self.box_index})"
+
+
+class OCRResult:
+    """
+    OCR output for one frame: a list of OCRLine records plus one (N, 4, 2)
+    float32 array holding the quadrilateral boxes of all lines.
+    """
+    __slots__ = ('timestamp', 'lines', 'boxes', 'translation')
+
+    def __init__(self, lines, boxes=None, timestamp=None, translation=None):
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.lines = lines
+        self.boxes = np.empty((0, 4, 2), dtype=np.float32) if boxes is None else boxes
+        self.translation = translation
+
+    @classmethod
+    def from_text(cls, text, timestamp=None):
+        """
+        Build a result from plain engine output such as Tesseract's, one line per row.
+        """
+        lines = [OCRLine(line.strip()) for line in text.splitlines() if line.strip()]
+        return cls(lines, timestamp=timestamp)
+
+    @property
+    def text(self):
+        return '\n'.join(line.text for line in self.lines)
+
+    def box(self, line):
+        if line.box_index < 0:
+            return None
+        return self.boxes[line.box_index]
+
+    def nbytes(self):
+        """
+        Approximate memory held by this result.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.lines) + self.boxes.nbytes
+        for line in self.lines:
+            size += sys.getsizeof(line) + sys.getsizeof(line.text)
+        if self.translation:
+            size += sys.getsizeof(self.translation)
+        return size
+
+    def to_dict(self):
+        return {
+            'timestamp': self.timestamp,
+            'text': [line.text for line in self.lines],
+            'confidence': [line.confidence for line in self.lines],
+            'box_index': [line.box_index for line in self.lines],
+            'boxes': self.boxes.tolist(),
+            'translation': self.translation,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        lines = [
+            OCRLine(text, confidence, box_index)
+            for text, confidence, box_index in zip(data['text'], data['confidence'], data['box_index'])
+        ]
+        boxes = np.asarray(data['boxes'], dtype=np.float32).reshape(-1, 4, 2)
+        return cls(lines, boxes, timestamp=data['timestamp'], translation=data.get('translation'))
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __repr__(self):
+        return f"OCRResult({len(self.lines)} lines, timestamp={self.timestamp:.3f})"
+
+
+def parse_paddleocr_results(results, timestamp=None):
+    """
+    Convert raw PaddleOCR output (one list of [box, (text, confidence)] entries
+    per input image, or None when nothing was found) into an OCRResult.
+    """
+    lines = []
+    boxes = []
+    for page in results or []:
+        if not page:
+            continue
+        for entry in page:
+            try:
+                box, (text, confidence) = entry
+            except (TypeError, ValueError):
+                print(f"Unexpected OCR line structure: {entry}")
+                continue
+            lines.append(OCRLine(text, confidence, len(boxes)))
+            boxes.append(box)
+
+    if boxes:
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4, 2)
+    else:
+        boxes = None
+    return OCRResult(lines, boxes, timestamp=timestamp)
+
+
+class SessionHistory:
+    """
+    Ring buffer of OCRResults for one overlay session.
+
+    The oldest results are evicted once either max_entries or max_bytes is
+    exceeded. If spill_path is set, evicted results are appended to that file
+    as JSON lines instead of being dropped, and remain available to search()
+    and replay().
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=16 * 1024 * 1024, spill_path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self._entries = collections.deque()
+        self._nbytes = 0
+        self.spilled = 0
+
+        if spill_path:
+            directory = os.path.dirname(os.path.abspath(spill_path))
+            os.makedirs(directory, exist_ok=True)
+
+    def append(self, result):
+        size = result.nbytes()
+        self._entries.append((result, size))
+        self._nbytes += size
+        self._evict()
+
+    def set_translation(self, result, translation):
+        """
+        Set the translation of a result that may already be in the history,
+        updating its size so max_bytes keeps accounting for translations.
+        """
+        result.translation = translation
+        # Translations arrive shortly after their result, so search from the newest entry
+        for index in range(len(self._entries) - 1, -1, -1):
+            entry, size = self._entries[index]
+            if entry is result:
+                new_size = result.nbytes()
+                self._entries[index] = (result, new_size)
+                self._nbytes += new_size - size
+                self._evict()
+                return
+
+    def _evict(self):
+        evicted = []
+        while self._entries and (len(self._entries) > self.max_entries or self._nbytes > self.max_bytes):
+            result, size = self._entries.popleft()
+            self._nbytes -= size
+            evicted.append(result)
+        if evicted and self.spill_path:
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                for result in evicted:
+                    f.write(json.dumps(result.to_dict(), ensure_ascii=False) + '\n')
+            self.spilled += len(evicted)
+
+    def latest(self):
+        return self._entries[-1][0] if self._entries else None
+
+    def nbytes(self):
+        return self._nbytes
+
+    def _iter_spilled(self):
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path, encoding='utf-8') as f:
+            for line in f:
+                yield OCRResult.from_dict(json.loads(line))
+
+    def replay(self, include_spilled=True):
+        """
+        Yield all results in the order they were recorded.
+        """
+        if include_spilled:
+            yield from self._iter_spilled()
+        for result, _ in self._entries:
+            yield result
+
+    def search(self, query, include_spilled=True):
+        """
+        Return results containing query in their recognised or translated text.
+        """
+        matches = []
+        for result in self.replay(include_spilled):
+            if query in result.text or (result.translation and query in result.translation):
+                matches.append(result)
+        return matches
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return (result for result, _ in self._entries)
@@ -0,0 +1,360 @@
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from model_manager import ENGINES, limit_threads, worker_cpu_threads
+from ocr_results import OCRLine, OCRResult, parse_paddleocr_results
+from translate import parse_scale, preprocess_frame, resolve_scale
+
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3
+
+
+def _create_engine(engine, ocr_kwargs, tier=None, cpu_threads=None):
+    """
+    Build the OCR callable used by a worker: processed (grayscale) image -> OCRResult.
+    With a tier, the model is loaded as ModelManager would load it and ocr_kwargs is ignored.
+    """
+    if tier is not None:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown OCR engine '{engine}'")
+        return ENGINES[engine](tier, cpu_threads)
+    if engine == 'paddle':
+        from paddleocr import PaddleOCR
+        options = {'cpu_threads': cpu_threads} if cpu_threads else {}
+        model = PaddleOCR(**{**options, **ocr_kwargs})
+        return lambda processed: parse_paddleocr_results(
+            model.ocr(cv2.cvtColor(processed, cv2.COLOR_GRAY2RGB), rec=True, cls=True)
+        )
+    if engine == 'tesseract':
+        import pytesseract
+        from PIL import Image
+        lang = ocr_kwargs.get('lang', 'jpn')
+        return lambda processed: OCRResult.from_text(pytesseract.image_to_string(Image.fromarray(processed), lang=lang))
+    raise ValueError(f"Unknown OCR engine '{engine}'")
+
+
+def _worker_main(slot_names, slot_busy, tasks, free_slots, results, engine, ocr_kwargs, tier, scale, cpu_threads):
+    """
+    Worker process loop: read frames straight out of shared memory, hand the
+    slot back as soon as preprocessing no longer needs it, then run OCR.
+    """
+    limit_threads(cpu_threads)
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    try:
+        ocr = _create_engine(engine, ocr_kwargs, tier, cpu_threads)
+    except Exception as e:
+        results.put(('failed', os.getpid(), f"{type(e).__name__}: {e}"))
+        for shm in slots:
+            shm.close()
+        return
+    results.put(('ready', os.getpid(), None))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, slot, shape = task
+        # Lets the pool skip this frame if the worker dies before returning it
+        results.put(('taken', os.getpid(), seq))
+        try:
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot].buf)
+            try:
+                frame_scale = resolve_scale(frame, scale, engine)
+                # preprocess_frame always returns a new array, so the slot is free after this
+                processed = preprocess_frame(frame, scale=frame_scale, engine=engine)
+            finally:
+                del frame
+                slot_busy[slot] = 0
+                free_slots.put(slot)
+            result = ocr(processed)
+        except Exception as e:
+            results.put((seq, None, f"{type(e).__name__}: {e}"))
+            continue
+        # Only the small result is pickled back, never the pixels
+        boxes = result.boxes / frame_scale
+        results.put((seq, ([line.text for line in result.lines], [line.confidence for line in result.lines], boxes), None))
+
+    for shm in slots:
+        shm.close()
+
+
+class OCRWorkerPool:
+    """
+    Pool of OCR worker processes fed through a ring of shared-memory frame slots.
+
+    submit() copies a frame into a free slot and queues only its slot index and
+    shape; each worker maps the slot without copying, keeps its own warm model,
+    and returns small OCRResults that are handed back in submission order.
+    Frames larger than a slot are downscaled to fit. If a worker dies, the
+    frame it was working on comes back as an empty result so later frames
+    are not held up. Each worker gets an equal share of the CPU threads, so
+    the workers' OCR libraries do not oversubscribe the machine.
+    """
+
+    def __init__(self, workers=None, slots=None, slot_bytes=DEFAULT_SLOT_BYTES, engine='paddle', ocr_kwargs=None, scale='auto',
+                 start_timeout=600.0, tier=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.n_slots = slots or self.workers * 2
+        self.slot_bytes = slot_bytes
+        self.engine = engine
+        self.ocr_kwargs = ocr_kwargs if ocr_kwargs is not None else {'lang': 'japan', 'use_angle_cls': True, 'show_log': False}
+        self.scale = scale
+        self.start_timeout = start_timeout
+        self.tier = tier
+
+        self._slots = []
+        self._processes = []
+        self._next_seq = 0
+        self._next_result = 0
+        self._reorder = {}
+        self._taken = {}
+        self._slot_seq = {}
+        self._downscale = {}
+        self._warned_size = False
+
+    def start(self):
+        """
+        Allocate the frame ring and start the workers, waiting until every model
+        is loaded. Raises RuntimeError if a worker fails to start or start_timeout
+        seconds pass.
+        """
+        ctx = mp.get_context('spawn')
+        self._slots = [shared_memory.SharedMemory(create=True, size=self.slot_bytes) for _ in range(self.n_slots)]
+        self._slot_busy = ctx.Array('b', self.n_slots, lock=False)
+        self._tasks = ctx.Queue()
+        self._free_slots = ctx.Queue()
+        self._results = ctx.Queue()
+        for slot in range(self.n_slots):
+            self._free_slots.put(slot)
+
+        slot_names = [shm.name for shm in self._slots]
+        for _ in range(self.workers):
+            process = ctx.Process(
+                target=_worker_main,
+                args=(slot_names, self._slot_busy, self._tasks, self._free_slots, self._results,
+                      self.engine, self.ocr_kwargs, self.tier, self.scale, worker_cpu_threads(self.workers)),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+
+        ready = 0
+        deadline = time.monotonic() + self.start_timeout
+        try:
+            while ready < self.workers:
+                try:
+                    kind, pid, error = self._results.get(timeout=1.0)
+                except queue.Empty:
+                    if not all(process.is_alive() for process in self._processes):
+                        raise RuntimeError("An OCR worker exited while loading its model")
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"OCR workers did not start within {self.start_timeout:.0f}s")
+                    continue
+                if kind == 'failed':
+                    raise RuntimeError(f"OCR worker {pid} failed to load the {self.engine} engine: {error}")
+                ready += 1
+        except RuntimeError:
+            self.close()
+            raise
+        print(f"Started {self.workers} OCR workers with {self.n_slots} frame slots")
+        return self
+
+    def submit(self, frame, block=True):
+        """
+        Queue a BGR frame for OCR. Returns its sequence number, or None if
+        block is False and every slot is busy, or no worker is left (the frame
+        is dropped).
+        """
+        if not self.alive():
+            return None
+        factor = 1.0
+        if frame.nbytes > self.slot_bytes:
+            # Downscale rather than fail, e.g. when the overlay is enlarged past the slot size
+            factor = (self.slot_bytes / frame.nbytes) ** 0.5
+            if not self._warned_size:
+                print(f"Warning: frames of {frame.shape[1]}x{frame.shape[0]} exceed the {self.slot_bytes} byte "
+                      f"frame slots and are downscaled for OCR")
+                self._warned_size = True
+            size = (max(int(frame.shape[1] * factor), 1), max(int(frame.shape[0] * factor), 1))
+            factor = size[0] / frame.shape[1]
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        try:
+            slot = self._free_slots.get(block=block)
+        except queue.Empty:
+            return None
+
+        target = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._slots[slot].buf)
+        np.copyto(target, frame)
+        del target
+
+        seq = self._next_seq
+        self._next_seq += 1
+        self._slot_busy[slot] = 1
+        self._slot_seq[slot] = seq
+        if factor != 1.0:
+            self._downscale[seq] = factor
+        self._tasks.put((seq, slot, frame.shape))
+        return seq
+
+    def pending(self):
+        return self._next_seq - self._next_result
+
+    def alive(self):
+        """
+        True while at least one worker process is running.
+        """
+        return any(process.is_alive() for process in self._processes)
+
+    def _store(self, message):
+        seq, payload, error = message
+        if seq == 'taken':
+            self._taken[payload] = error
+            return
+        factor = self._downscale.pop(seq, 1.0)
+        if error is not None:
+            print(f"OCR worker failed on frame {seq}: {error}")
+            self._reorder[seq] = OCRResult([])
+            return
+        texts, confidences, boxes = payload
+        lines = [OCRLine(text, confidence, index) for index, (text, confidence) in enumerate(zip(texts, confidences))]
+        self._reorder[seq] = OCRResult(lines, boxes / factor if len(boxes) else None)
+
+    def _check_workers(self):
+        """
+        Give up on frames that can no longer arrive: the one each dead worker
+        had taken, and every frame still queued once no worker is left.
+        """
+        for process in self._processes:
+            if process.is_alive() or process.pid not in self._taken:
+                continue
+            seq = self._taken.pop(process.pid)
+            if seq >= self._next_result and seq not in self._reorder:
+                print(f"OCR worker {process.pid} exited (code {process.exitcode}) while processing frame {seq}")
+                self._lose(seq)
+                for slot, slot_seq in self._slot_seq.items():
+                    # The slot is returned only if the worker died before freeing it
+                    if slot_seq == seq and self._slot_busy[slot]:
+                        self._slot_busy[slot] = 0
+                        self._free_slots.put(slot)
+        if not self.alive():
+            for seq in range(self._next_result, self._next_seq):
+                if seq not in self._reorder:
+                    self._lose(seq)
+
+    def _lose(self, seq):
+        self._downscale.pop(seq, None)
+        self._reorder[seq] = OCRResult([])
+
+    def get(self, timeout=None):
+        """
+        Return the result for the next frame in submission order, blocking until
+        it is available. Raises queue.Empty if timeout seconds pass first.
+        """
+        if self.pending() == 0:
+            raise RuntimeError("No frames pending")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._next_result not in self._reorder:
+            wait = 1.0 if deadline is None else min(1.0, max(deadline - time.monotonic(), 0))
+            try:
+                self._store(self._results.get(timeout=wait))
+            except queue.Empty:
+                # Drain first: a 'taken' message may still be in flight from a worker that just exited
+                self._drain()
+                self._check_workers()
+                if deadline is not None and time.monotonic() >= deadline and self._next_result not in self._reorder:
+                    raise
+        result = self._reorder.pop(self._next_result)
+        self._next_result += 1
+        return result
+
+    def _drain(self):
+        while True:
+            try:
+                self._store(self._results.get_nowait())
+            except queue.Empty:
+                break
+
+    def poll(self):
+        """
+        Return all results that are ready in submission order, without blocking.
+        """
+        self._drain()
+        self._check_workers()
+        ready = []
+        while self._next_result in self._reorder:
+            ready.append(self._reorder.pop(self._next_result))
+            self._next_result += 1
+        return ready
+
+    def close(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._slots = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def load_frames(path):
+    """
+    Load benchmark frames from an image file or a recorded session directory.
+    """
+    if os.path.isdir(path):
+        from session_recorder import SessionReplayer
+        return [frame.copy() for _, frame in SessionReplayer(path).frames()]
+    image = cv2.imread(path)
+    if image is None:
+        print(f"Error: Unable to load image at {path}")
+        sys.exit(1)
+    return [image]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure OCR throughput of the shared-memory worker pool for several worker counts.')
+    parser.add_argument('source', type=str, help='Image file or recorded session directory to use as input frames.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker counts to benchmark.')
+    parser.add_argument('--frames', type=int, default=32, help='Number of frames to submit per run.')
+    parser.add_argument('--engine', choices=['paddle', 'tesseract'], default='paddle', help='OCR engine run by each worker.')
+    parser.add_argument('--scale', type=parse_scale, default='auto', help="Resize factor applied before OCR, or 'auto' to pick it per frame.")
+
+    args = parser.parse_args()
+
+    frames = load_frames(args.source)
+    slot_bytes = max(frame.nbytes for frame in frames)
+    ocr_kwargs = {'lang': 'jpn'} if args.engine == 'tesseract' else None
+
+    baseline = None
+    print(f"{'workers':>7} {'frames/s':>9} {'speedup':>8}")
+    for workers in args.workers:
+        with OCRWorkerPool(workers, slot_bytes=slot_bytes, engine=args.engine, ocr_kwargs=ocr_kwargs, scale=args.scale) as pool:
+            start = time.perf_counter()
+            for i in range(args.frames):
+                pool.submit(frames[i % len(frames)])
+                pool.poll()
+            while pool.pending():
+                pool.get()
+            fps = args.frames / (time.perf_counter() - start)
+        baseline = baseline or fps
+        print(f"{workers:>7} {fps:9.2f} {fps / baseline:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
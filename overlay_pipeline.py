@@ -0,0 +1,96 @@
+import time
+
+import pytesseract
+from deep_translator import GoogleTranslator
+from PIL import Image
+
+from ocr_results import OCRResult, SessionHistory
+
+
+def tesseract_ocr(frame):
+    """
+    Run Tesseract (Japanese) on a BGR frame and return the recognised text.
+    """
+    # Convert the BGR frame to PIL Image
+    pil_im = Image.fromarray(frame[:, :, ::-1])
+    return pytesseract.image_to_string(pil_im, lang='jpn')
+
+
+class OverlayPipeline:
+    """
+    The OCR -> translate step behind ScreenshotWindow, kept free of Qt so it
+    can also be driven headless (e.g. by the session replayer).
+
+    ocr is a callable taking a BGR frame and returning text or an OCRResult
+    (kept as is, with its boxes and confidences); translator is any
+    object with a translate(text) method. If translation_queue is given, new
+    text is submitted to it (with the OCRResult as context) and returned
+    untranslated unless the queue has it cached; the queue's on_result
+    callback delivers the translation, to be passed to set_translation().
+    """
+
+    def __init__(self, ocr=tesseract_ocr, translator=None, history=None, translation_queue=None):
+        self.ocr = ocr
+        self.translator = translator or GoogleTranslator(source='auto', target='en')
+        self.history = history if history is not None else SessionHistory()
+        self.translation_queue = translation_queue
+        self.last_timings = {}
+
+    def process(self, frame):
+        """
+        OCR and translate one frame. Returns the new OCRResult, or None when no
+        text was found or the text is unchanged since the last frame.
+        """
+        start = time.perf_counter()
+        result = self.ocr(frame)
+        if not isinstance(result, OCRResult):
+            result = OCRResult.from_text(result)
+        ocr_time = time.perf_counter() - start
+        result = self.process_result(result)
+        self.last_timings['ocr'] = ocr_time
+        return result
+
+    def process_result(self, result):
+        """
+        Translate an OCRResult produced elsewhere (e.g. by an OCRWorkerPool).
+        Returns it with its translation set (still None when a translation queue
+        is used), or None when it has no text or the text is unchanged since
+        the last result.
+        """
+        self.last_timings = {'ocr': 0.0, 'translate': 0.0}
+        queue = self.translation_queue
+
+        if not result.lines:
+            if queue is not None:
+                # Nothing on screen: pending translations are obsolete
+                queue.set_visible(())
+            return None
+
+        # Skip translation if nothing changed since the last frame
+        previous = self.history.latest()
+        if previous is not None and result.text == previous.text:
+            if queue is not None and previous.translation is None:
+                # Still visible but not translated yet (e.g. cancelled during a blank frame)
+                translation = queue.submit(previous.text, previous)
+                if translation is not None:
+                    self.set_translation(previous, translation)
+                    return previous
+            return None
+
+        self.history.append(result)
+        if queue is not None:
+            translation = queue.submit(result.text, result)
+            if translation is not None:
+                self.set_translation(result, translation)
+            return result
+
+        start = time.perf_counter()
+        self.set_translation(result, self.translator.translate(result.text))
+        self.last_timings['translate'] = time.perf_counter() - start
+        return result
+
+    def set_translation(self, result, translation):
+        """
+        Attach a translation to a result, keeping the history's size accounting current.
+        """
+        self.history.set_translation(result, translation)
@@ -0,0 +1,339 @@
+import argparse
+import collections
+import csv
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from model_manager import ENGINES, TIERS, limit_threads, worker_cpu_threads
+from translate import parse_scale, resize_image, resolve_scale, deskew
+
+DEFAULT_PARAMS = {
+    'scale': 'auto',
+    'clip_limit': 2.0,
+    'tile_grid': 8,
+    'max_angle': 15.0,
+    'block_size': 11,
+    'C': 12,
+    'kernel_size': 2,
+    'iterations': 1,
+    'engine': 'paddle',
+    'tier': 'lite',
+}
+
+# OCR models of the current process by (engine, tier), created on first use by the ocr stage
+_ocr_models = {}
+
+# CPU threads each OCR model may use; set in sweep workers by _init_worker
+_cpu_threads = None
+
+
+def _load_stage(path):
+    image = cv2.imread(path)
+    if image is None:
+        raise FileNotFoundError(f"Unable to load image at {path}")
+    return image
+
+
+def _resize_stage(image, scale, engine='paddle'):
+    return resize_image(image, scale=resolve_scale(image, scale, engine))
+
+
+def _clahe_stage(image, clip_limit, tile_grid):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_grid, tile_grid))
+    return clahe.apply(gray)
+
+
+def _deskew_stage(gray, max_angle):
+    return deskew(gray, max_angle=max_angle)
+
+
+def _threshold_stage(gray, block_size, C):
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, block_size, C)
+
+
+def _morphology_stage(thresh, kernel_size, iterations):
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    return cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel, iterations=iterations)
+
+
+def _ocr_stage(processed, engine, tier):
+    # Loaded the same way ModelManager loads them, so every engine and tier can be swept
+    if (engine, tier) not in _ocr_models:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown OCR engine '{engine}'. Choose from: {', '.join(ENGINES)}")
+        if tier not in TIERS:
+            raise ValueError(f"Unknown model tier '{tier}'. Choose from: {', '.join(TIERS)}")
+        _ocr_models[engine, tier] = ENGINES[engine](tier, _cpu_threads)
+    return _ocr_models[engine, tier](processed).text
+
+
+# Stages in pipeline order: (name, parameters it depends on, function).
+# Unlike preprocess_frame, CLAHE output feeds the later stages (as in the notebook);
+# see STAGE_ORDER_NOTE.
+STAGES = [
+    ('resize', ('scale',), _resize_stage),
+    ('clahe', ('clip_limit', 'tile_grid'), _clahe_stage),
+    ('deskew', ('max_angle',), _deskew_stage),
+    ('threshold', ('block_size', 'C'), _threshold_stage),
+    ('morphology', ('kernel_size', 'iterations'), _morphology_stage),
+    ('ocr', ('engine', 'tier'), _ocr_stage),
+]
+
+PARAM_ORDER = [param for _, params, _ in STAGES for param in params]
+
+STAGE_ORDER_NOTE = (
+    "Note: this sweep thresholds the CLAHE-enhanced image, while translate.preprocess_frame "
+    "thresholds the deskewed image without CLAHE. Tuned clip_limit/tile_grid, block_size and C "
+    "only carry over once preprocess_frame uses the same stage order."
+)
+
+
+class PreprocessDAG:
+    """
+    Memoized preprocessing pipeline. Each stage output is cached under a key
+    derived from its input's key and its own parameters, so evaluating a new
+    configuration only recomputes the stages at and below the first changed
+    parameter.
+
+    The in-memory cache holds at most max_entries outputs (least recently used
+    are evicted). With cache_dir set, outputs are also pickled to disk, which
+    lets parallel workers and later runs share them.
+
+    The stages follow the notebook rather than translate.preprocess_frame:
+    the contrast-enhanced (CLAHE) image is deskewed and thresholded, whereas
+    preprocess_frame discards it. Constants tuned here only apply once
+    preprocess_frame uses the same order.
+    """
+
+    def __init__(self, max_entries=64, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._cache = collections.OrderedDict()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _key(parent_key, name, params):
+        digest = hashlib.sha1(parent_key.encode())
+        digest.update(name.encode())
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _lookup(self, key):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, key + '.pkl')
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    entry = pickle.load(f)
+                self._remember(key, entry)
+                return entry
+        return None
+
+    def _remember(self, key, entry):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _store(self, key, entry):
+        self._remember(key, entry)
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, key + '.pkl')
+            with open(path + '.tmp', 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + '.tmp', path)
+
+    def run(self, image_path, params):
+        """
+        Evaluate the pipeline for one configuration. Returns (ocr_text, stats)
+        where stats holds the seconds actually computed in this call, the cost
+        of the full uncached pipeline, and the number of stages recomputed.
+        """
+        params = {**DEFAULT_PARAMS, **params}
+        key = self._key('', 'load', {'path': os.path.abspath(image_path), 'mtime': os.path.getmtime(image_path)})
+        stats = {'computed_s': 0.0, 'pipeline_s': 0.0, 'recomputed': 0}
+
+        entry = self._lookup(key)
+        if entry is None:
+            start = time.perf_counter()
+            entry = (_load_stage(image_path), time.perf_counter() - start)
+            self._store(key, entry)
+            stats['computed_s'] += entry[1]
+        value = entry[0]
+        stats['pipeline_s'] += entry[1]
+
+        for name, names, function in STAGES:
+            stage_params = {param: params[param] for param in names}
+            if name == 'resize' and params['scale'] == 'auto':
+                # The auto scale targets the OCR engine's preferred text height
+                stage_params['engine'] = params['engine']
+            key = self._key(key, name, stage_params)
+            entry = self._lookup(key)
+            if entry is None:
+                start = time.perf_counter()
+                entry = (function(value, **stage_params), time.perf_counter() - start)
+                self._store(key, entry)
+                stats['computed_s'] += entry[1]
+                stats['recomputed'] += 1
+            value = entry[0]
+            stats['pipeline_s'] += entry[1]
+        return value, stats
+
+
+def edit_distance(a, b):
+    """
+    Levenshtein distance between two strings.
+    """
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def character_accuracy(text, truth):
+    """
+    1 - character error rate, ignoring whitespace.
+    """
+    text = ''.join(text.split())
+    truth = ''.join(truth.split())
+    if not truth:
+        return 1.0 if not text else 0.0
+    return max(0.0, 1.0 - edit_distance(text, truth) / len(truth))
+
+
+def expand_grid(grid):
+    """
+    Expand {param: [values]} into configurations sorted in stage order, so
+    that neighbouring configurations share the longest possible prefix.
+    """
+    names = [param for param in PARAM_ORDER if param in grid]
+    configs = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    # 'auto' scales sort after numeric ones
+    configs.sort(key=lambda config: [(isinstance(config[name], str), config[name]) for name in names])
+    return configs
+
+
+def _init_worker(cpu_threads):
+    global _cpu_threads
+    _cpu_threads = cpu_threads
+    limit_threads(cpu_threads)
+
+
+def _run_chunk(image_path, configs, truth, max_entries, cache_dir):
+    dag = PreprocessDAG(max_entries=max_entries, cache_dir=cache_dir)
+    rows = []
+    for config in configs:
+        text, stats = dag.run(image_path, config)
+        row = dict(config)
+        row.update(stats)
+        row['accuracy'] = character_accuracy(text, truth) if truth is not None else None
+        row['text'] = text
+        rows.append(row)
+    return rows
+
+
+def sweep(image_path, grid, truth=None, workers=None, max_entries=64, cache_dir=None):
+    """
+    Evaluate every configuration of the grid. Configurations are split into
+    contiguous chunks (one per worker) so each worker reuses shared prefixes.
+    """
+    configs = expand_grid(grid)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(configs)))
+    size = -(-len(configs) // workers)
+    chunks = [configs[i:i + size] for i in range(0, len(configs), size)]
+
+    if workers == 1:
+        return _run_chunk(image_path, configs, truth, max_entries, cache_dir)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(worker_cpu_threads(workers),)) as pool:
+        futures = [pool.submit(_run_chunk, image_path, chunk, truth, max_entries, cache_dir) for chunk in chunks]
+        return [row for future in futures for row in future.result()]
+
+
+def parse_grid(items):
+    """
+    Parse NAME=V1,V2,... arguments into a parameter grid.
+    """
+    grid = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        if name not in DEFAULT_PARAMS:
+            raise argparse.ArgumentTypeError(f"Unknown parameter '{name}'. Choose from: {', '.join(DEFAULT_PARAMS)}")
+        cast = parse_scale if name == 'scale' else type(DEFAULT_PARAMS[name])
+        grid[name] = [cast(value) for value in values.split(',')]
+        choices = {'engine': ENGINES, 'tier': TIERS}.get(name)
+        unknown = [value for value in grid[name] if choices is not None and value not in choices]
+        if unknown:
+            value = unknown[0]
+            raise argparse.ArgumentTypeError(f"Unknown {name} '{value}'. Choose from: {', '.join(choices)}")
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep preprocessing parameters with memoized stages and report OCR accuracy and time.')
+    parser.add_argument('image_path', type=str, help='Image to preprocess.')
+    parser.add_argument('params', nargs='*', help='Parameter grid as NAME=V1,V2,... (e.g. scale=1.5,2,3 C=8,12).')
+    parser.add_argument('--truth', type=str, help='Text file with the ground-truth transcription.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (defaults to the CPU count).')
+    parser.add_argument('--cache_dir', type=str, help='Directory for an on-disk stage cache shared between workers and runs.')
+    parser.add_argument('--max_entries', type=int, default=64, help='Stage outputs kept in memory per worker.')
+    parser.add_argument('--csv', type=str, help='Write the results table to this CSV file.')
+
+    args = parser.parse_args()
+
+    try:
+        grid = parse_grid(args.params)
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    truth = None
+    if args.truth:
+        with open(args.truth, encoding='utf-8') as f:
+            truth = f.read()
+
+    start = time.perf_counter()
+    rows = sweep(args.image_path, grid, truth, args.workers, args.max_entries, args.cache_dir)
+    elapsed = time.perf_counter() - start
+
+    names = [param for param in PARAM_ORDER if param in grid]
+    rows.sort(key=lambda row: (row['accuracy'] if row['accuracy'] is not None else 0.0, -row['pipeline_s']), reverse=True)
+    header = ' '.join(f"{name:>11}" for name in names)
+    print(f"{header} {'accuracy':>9} {'pipeline s':>11} {'computed s':>11} {'stages':>7}")
+    for row in rows:
+        values = ' '.join(f"{str(row[name]):>11}" for name in names)
+        accuracy = f"{row['accuracy']:.3f}" if row['accuracy'] is not None else '-'
+        print(f"{values} {accuracy:>9} {row['pipeline_s']:11.3f} {row['computed_s']:11.3f} {row['recomputed']:>7}")
+
+    full_cost = sum(row['pipeline_s'] for row in rows)
+    print(f"\n{len(rows)} configurations in {elapsed:.2f}s wall time "
+          f"(uncached pipelines would cost {full_cost:.2f}s of CPU time)")
+    print(STAGE_ORDER_NOTE)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=names + ['accuracy', 'pipeline_s', 'computed_s', 'recomputed', 'text'])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({field: row.get(field) for field in writer.fieldnames})
+        print(f"Results saved to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+import argparse
+import collections
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from model_manager import ENGINES, TIERS, ModelManager
+from overlay_pipeline import OverlayPipeline
+from translation_queue import TranslationQueue
+
+INDEX_FILENAME = 'index.jsonl'
+FRAMES_DIRNAME = 'frames'
+
+
+class SessionRecorder:
+    """
+    Record captured frames to a directory for later replay.
+
+    Each distinct frame is stored once as a PNG named by its content hash;
+    index.jsonl gets one line per captured frame with its time offset from the
+    start of the recording and the captured region geometry. The directory
+    must not already hold a recorded session.
+
+    record() only copies the frame and queues it; hashing, PNG encoding and
+    file writes happen on a background thread so they do not slow down the
+    capture loop being recorded. At most max_queued frames wait for the
+    writer before record() blocks.
+    """
+
+    def __init__(self, directory, png_compression=3, max_queued=64):
+        self.directory = directory
+        self.frames_dir = os.path.join(directory, FRAMES_DIRNAME)
+        index_path = os.path.join(directory, INDEX_FILENAME)
+        # Time offsets restart at 0, so appending a second run would break realtime replay
+        if os.path.exists(index_path) and os.path.getsize(index_path) > 0:
+            raise FileExistsError(f"{directory} already contains a recorded session; choose a new directory")
+        os.makedirs(self.frames_dir, exist_ok=True)
+        self.png_params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+
+        self._index = open(index_path, 'w', encoding='utf-8')
+        self._start = time.monotonic()
+        self._known = set(name[:-4] for name in os.listdir(self.frames_dir) if name.endswith('.png'))
+        self.frames = 0
+        self.unique_frames = 0
+
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._writer = threading.Thread(target=self._write_loop, name='session-recorder', daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def frame_digest(frame):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(frame.shape).encode())
+        digest.update(np.ascontiguousarray(frame).data)
+        return digest.hexdigest()
+
+    def record(self, frame, geometry):
+        """
+        Record one BGR frame captured at geometry (x, y, w, h).
+        """
+        # Capture backends reuse their buffers, so the writer gets its own copy
+        self._queue.put((time.monotonic() - self._start, frame.copy(), geometry))
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            offset, frame, (x, y, w, h) = item
+            key = self.frame_digest(frame)
+            if key not in self._known:
+                ok, encoded = cv2.imencode('.png', frame, self.png_params)
+                if not ok:
+                    print(f"Error: Unable to encode frame {key}")
+                    continue
+                with open(os.path.join(self.frames_dir, key + '.png'), 'wb') as f:
+                    f.write(encoded.tobytes())
+                self._known.add(key)
+                self.unique_frames += 1
+
+            entry = {'t': offset, 'frame': key, 'x': x, 'y': y, 'w': w, 'h': h}
+            self._index.write(json.dumps(entry) + '\n')
+            self.frames += 1
+
+    def close(self):
+        """
+        Write out all queued frames and close the index.
+        """
+        self._queue.put(None)
+        self._writer.join()
+        self._index.close()
+        print(f"Recorded {self.frames} frames ({self.unique_frames} unique) to {self.directory}")
+
+
+class SessionReplayer:
+    """
+    Read back a session written by SessionRecorder.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        index_path = os.path.join(directory, INDEX_FILENAME)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"No recorded session at {directory}")
+        with open(index_path, encoding='utf-8') as f:
+            self.entries = [json.loads(line) for line in f if line.strip()]
+
+    def frames(self, realtime=False):
+        """
+        Yield (entry, frame) pairs. With realtime=True, frames are yielded at
+        the pace they were captured; otherwise as fast as possible.
+        """
+        cached_key, cached_frame = None, None
+        start = time.monotonic()
+        for entry in self.entries:
+            if realtime:
+                delay = entry['t'] - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            # Consecutive duplicates are decoded only once
+            if entry['frame'] != cached_key:
+                path = os.path.join(self.directory, FRAMES_DIRNAME, entry['frame'] + '.png')
+                cached_frame = cv2.imread(path)
+                cached_key = entry['frame']
+            if cached_frame is None:
+                print(f"Warning: Unable to load frame {path}, skipping it")
+                continue
+            yield entry, cached_frame
+
+    def replay(self, pipeline, realtime=False, ocr_pool=None, translations=None):
+        """
+        Feed every recorded frame through the pipeline and return a list of
+        per-frame timing dicts.
+
+        With an ocr_pool (an OCRWorkerPool), frames are OCR'd in its workers
+        and their results passed to pipeline.process_result(), as in the
+        overlay; 'ocr' is then the time from submitting a frame to its result.
+        With a translation queue on the pipeline, translations delivered to
+        the translations queue as (result, translation) pairs are attached
+        between frames, and replay() waits for the queue to go idle before
+        returning.
+        """
+        timings = []
+        submitted = collections.deque()
+
+        def finish(result, start):
+            ocr_done = time.perf_counter()
+            result = pipeline.process_result(result)
+            timing = dict(pipeline.last_timings)
+            timing['ocr'] = ocr_done - start
+            timing['total'] = time.perf_counter() - start
+            timing['changed'] = result is not None
+            timings.append(timing)
+
+        for entry, frame in self.frames(realtime):
+            start = time.perf_counter()
+            if ocr_pool is not None and ocr_pool.submit(frame) is not None:
+                submitted.append(start)
+                for result in ocr_pool.poll():
+                    finish(result, submitted.popleft())
+            else:
+                # No pool, or every worker has died: OCR in this process like the overlay does
+                result = pipeline.process(frame)
+                timing = dict(pipeline.last_timings)
+                timing['total'] = time.perf_counter() - start
+                timing['changed'] = result is not None
+                timings.append(timing)
+            self._apply_translations(pipeline, translations)
+
+        while submitted:
+            finish(ocr_pool.get(), submitted.popleft())
+            self._apply_translations(pipeline, translations)
+
+        if pipeline.translation_queue is not None:
+            while not pipeline.translation_queue.idle():
+                time.sleep(0.01)
+            self._apply_translations(pipeline, translations)
+        return timings
+
+    @staticmethod
+    def _apply_translations(pipeline, translations):
+        if translations is None:
+            return
+        while True:
+            try:
+                result, translation = translations.get_nowait()
+            except queue.Empty:
+                return
+            pipeline.set_translation(result, translation)
+
+
+class StubTranslator:
+    """
+    Local stand-in for GoogleTranslator, with an optional simulated latency.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def translate(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return f"[en] {text}"
+
+
+def summarize_timings(timings):
+    """
+    Print per-stage latency statistics for a replay run.
+    """
+    if not timings:
+        print("No frames replayed.")
+        return
+    print(f"Frames: {len(timings)}, text changes: {sum(t['changed'] for t in timings)}")
+    for stage in ('ocr', 'translate', 'total'):
+        values = np.array([t.get(stage, 0.0) for t in timings]) * 1000
+        print(f"{stage:<10} mean {values.mean():8.2f} ms  p50 {np.percentile(values, 50):8.2f} ms  "
+              f"p95 {np.percentile(values, 95):8.2f} ms  max {values.max():8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded overlay session headless through the OCR and translation pipeline.')
+    parser.add_argument('session_dir', type=str, help='Directory written by moving_box_prod.py --record.')
+    parser.add_argument('--realtime', action='store_true', help='Replay at the recorded pace instead of as fast as possible.')
+    parser.add_argument('--translate_delay', type=float, default=0.0, help='Simulated translation latency in seconds.')
+    parser.add_argument('--google', action='store_true', help='Use the real Google translator instead of the local stub.')
+    parser.add_argument('--ocr-engine', choices=list(ENGINES),
+                        help='OCR engine (default: tesseract in process, paddle with --ocr-workers).')
+    parser.add_argument('--model-tier', default='lite', choices=TIERS, help='Model size: lite for small machines, server for accuracy.')
+    parser.add_argument('--ocr-workers', type=int, default=0, help='Run OCR in this many worker processes, as the overlay does.')
+    parser.add_argument('--async-translate', action='store_true',
+                        help='Translate through the background translation queue, as the overlay does by default.')
+
+    args = parser.parse_args()
+
+    try:
+        replayer = SessionReplayer(args.session_dir)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    translator = None if args.google else StubTranslator(args.translate_delay)
+    pipeline = OverlayPipeline(translator=translator)
+    model_manager = ModelManager(idle_ttl=None, default_tier=args.model_tier)
+    engine = args.ocr_engine or 'tesseract'
+    pipeline.ocr = lambda frame: model_manager.ocr(engine, frame)
+
+    translations = None
+    if args.async_translate:
+        translations = queue.SimpleQueue()
+        pipeline.translation_queue = TranslationQueue(
+            pipeline.translator, lambda text, translation, result: translations.put((result, translation))
+        )
+
+    ocr_pool = None
+    if args.ocr_workers:
+        # Imported here so the default Tesseract mode does not pull in PaddleOCR
+        from ocr_workers import DEFAULT_SLOT_BYTES, OCRWorkerPool
+        sizes = [entry['w'] * entry['h'] * 3 for entry in replayer.entries]
+        slot_bytes = max(sizes + [DEFAULT_SLOT_BYTES])
+        try:
+            ocr_pool = OCRWorkerPool(args.ocr_workers, slot_bytes=slot_bytes, engine=args.ocr_engine or 'paddle',
+                                     tier=args.model_tier).start()
+        except RuntimeError as e:
+            print(f"Error starting OCR workers: {e}")
+            print("Running OCR in this process instead")
+
+    print(f"Replaying {len(replayer.entries)} frames from {args.session_dir}...")
+    try:
+        summarize_timings(replayer.replay(pipeline, realtime=args.realtime, ocr_pool=ocr_pool,
+                                          translations=translations))
+    finally:
+        if pipeline.translation_queue is not None:
+            pipeline.translation_queue.close()
+            mean_latency, max_latency = pipeline.translation_queue.latency_summary()
+            print(f"Translation latency: mean {mean_latency * 1000:.0f} ms, max {max_latency * 1000:.0f} ms")
+        if ocr_pool is not None:
+            ocr_pool.close()
+    print(model_manager.format_report())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+import argparse
+import difflib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2
+import numpy as np
+
+from model_manager import limit_threads, worker_cpu_threads
+from ocr_results import OCRLine, OCRResult, parse_paddleocr_results
+from translate import parse_scale, preprocess_frame, resolve_scale, save_extracted_text
+
+# OCR model of the current worker process, created once by _init_worker
+_worker_model = None
+
+
+def split_tiles(height, width, tile_size=1024, overlap=128):
+    """
+    Split an image into overlapping tiles. Returns (x, y, w, h) rectangles in
+    original image coordinates. Tiles are spread evenly, using the fewest that
+    keep at least `overlap` pixels shared between neighbours.
+    """
+    if overlap >= tile_size:
+        raise ValueError("overlap must be smaller than tile_size")
+    step = tile_size - overlap
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        count = -(-(length - overlap) // step)
+        # Even spacing; the last tile is flush with the edge
+        return [round(i * (length - tile_size) / (count - 1)) for i in range(count)]
+
+    return [
+        (x, y, min(tile_size, width - x), min(tile_size, height - y))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def _init_worker(ocr_kwargs, cpu_threads):
+    global _worker_model
+    from paddleocr import PaddleOCR
+    limit_threads(cpu_threads)
+    _worker_model = PaddleOCR(**{'cpu_threads': cpu_threads, **ocr_kwargs})
+
+
+def _ocr_tile(tile, x, y, scale):
+    """
+    Preprocess and OCR one tile in a worker process. Returns texts,
+    confidences and boxes mapped back to original image coordinates.
+    """
+    # With scale='auto' each tile gets its own scale, so headings and small print
+    # in different regions are both brought to the target text height
+    scale = resolve_scale(tile, scale)
+
+    # Deskewing tiles independently would rotate them by different angles and
+    # break the mapping of boxes back to the full image, so it is skipped here
+    processed = preprocess_frame(tile, scale=scale, apply_deskew=False)
+    rgb_image = cv2.cvtColor(processed, cv2.COLOR_GRAY2RGB)
+    result = parse_paddleocr_results(_worker_model.ocr(rgb_image, rec=True, cls=True))
+
+    boxes = result.boxes / scale + np.array([x, y], dtype=np.float32)
+    return [line.text for line in result.lines], [line.confidence for line in result.lines], boxes
+
+
+def _bounds(boxes):
+    return boxes[:, :, 0].min(axis=1), boxes[:, :, 1].min(axis=1), boxes[:, :, 0].max(axis=1), boxes[:, :, 1].max(axis=1)
+
+
+def _join_text(first, second, first_span, second_span):
+    """
+    Join the texts of two fragments of one line that overlap along the line
+    (first starts before second). The shared characters are found near the
+    end of first and the start of second, which also drops a character
+    misread where a tile border cut through it.
+    """
+    (a1, a2), (b1, b2) = first_span, second_span
+    shared = a2 - b1
+    # Character range of the overlap zone in each fragment, assuming even character widths
+    first_from = max(int(len(first) * (b1 - a1) / max(a2 - a1, 1e-6)) - 2, 0)
+    second_to = min(int(np.ceil(len(second) * shared / max(b2 - b1, 1e-6))) + 2, len(second))
+    matcher = difflib.SequenceMatcher(None, first, second, autojunk=False)
+    i, j, size = matcher.find_longest_match(first_from, len(first), 0, second_to)
+    if size == 0:
+        return first + second
+    return first[:i] + second[j:]
+
+
+def merge_fragments(boxes, texts, scores, row_overlap=0.5, sources=None):
+    """
+    Merge detections of the same text line from neighbouring tiles.
+
+    Two boxes belong to one line when they overlap along the line's direction
+    (horizontal for wide boxes, vertical for tall ones, as in vertical
+    Japanese) and share more than `row_overlap` of the smaller box across it.
+    Such a group becomes one box spanning all fragments. A fragment lying
+    inside another is a duplicate and only adds its text if it scores higher
+    at about the same length. Otherwise the overlapping text of neighbouring
+    fragments is de-duplicated, so a line crossing a tile seam is kept whole.
+    If sources (e.g. the tile index of each box) is given, boxes from the same
+    source are never merged with each other. Returns the merged (boxes, texts, scores).
+    """
+    n = len(boxes)
+    if n == 0:
+        return boxes, list(texts), list(scores)
+    x1, y1, x2, y2 = _bounds(boxes)
+
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(n):
+        for j in range(i + 1, n):
+            if sources is not None and sources[i] == sources[j]:
+                continue
+            horizontal = max(x2[i], x2[j]) - min(x1[i], x1[j]) >= max(y2[i], y2[j]) - min(y1[i], y1[j])
+            if horizontal:
+                along = min(x2[i], x2[j]) - max(x1[i], x1[j])
+                across = min(y2[i], y2[j]) - max(y1[i], y1[j])
+                thickness = min(y2[i] - y1[i], y2[j] - y1[j])
+            else:
+                along = min(y2[i], y2[j]) - max(y1[i], y1[j])
+                across = min(x2[i], x2[j]) - max(x1[i], x1[j])
+                thickness = min(x2[i] - x1[i], x2[j] - x1[j])
+            if along > 0 and across > row_overlap * max(thickness, 1e-6):
+                parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+
+    merged_boxes, merged_texts, merged_scores = [], [], []
+    for members in groups.values():
+        if len(members) == 1:
+            i = members[0]
+            merged_boxes.append(boxes[i])
+            merged_texts.append(texts[i])
+            merged_scores.append(scores[i])
+            continue
+
+        gx1, gy1 = x1[members].min(), y1[members].min()
+        gx2, gy2 = x2[members].max(), y2[members].max()
+        axis_start, axis_end = (x1, x2) if gx2 - gx1 >= gy2 - gy1 else (y1, y2)
+        members.sort(key=lambda i: (axis_start[i], -axis_end[i]))
+
+        first = members[0]
+        text, score = texts[first], scores[first]
+        span = (axis_start[first], axis_end[first])
+        for i in members[1:]:
+            if axis_end[i] <= span[1]:
+                # Duplicate of text already covered; prefer it only if it is a better read of the same extent
+                if axis_end[i] - axis_start[i] >= 0.9 * (span[1] - span[0]) and scores[i] > score:
+                    text, score = texts[i], scores[i]
+                continue
+            text = _join_text(text, texts[i], span, (axis_start[i], axis_end[i]))
+            score = min(score, scores[i])
+            span = (span[0], axis_end[i])
+
+        merged_boxes.append(np.array([[gx1, gy1], [gx2, gy1], [gx2, gy2], [gx1, gy2]], dtype=np.float32))
+        merged_texts.append(text)
+        merged_scores.append(score)
+
+    return np.asarray(merged_boxes, dtype=np.float32).reshape(-1, 4, 2), merged_texts, merged_scores
+
+
+def reading_order(boxes):
+    """
+    Sort boxes in reading order. For mostly horizontal text: rows top to
+    bottom, left to right within a row. For mostly vertical text (taller than
+    wide, as in vertical Japanese): columns right to left, top to bottom within
+    a column. Boxes whose centres across the lines are closer than half the
+    median line thickness share a row or column.
+    """
+    if len(boxes) == 0:
+        return []
+    x1, y1, x2, y2 = _bounds(boxes)
+    vertical = np.count_nonzero(y2 - y1 > x2 - x1) > len(boxes) / 2
+    if vertical:
+        # Columns from the right: order by negated horizontal position
+        centre, thickness, start = -(x1 + x2) / 2, x2 - x1, y1
+    else:
+        centre, thickness, start = (y1 + y2) / 2, y2 - y1, x1
+    tolerance = max(float(np.median(thickness)) / 2, 1.0)
+
+    lines = []
+    for i in np.argsort(centre, kind='stable'):
+        if lines and centre[i] - lines[-1]['centre'] <= tolerance:
+            lines[-1]['members'].append(i)
+        else:
+            lines.append({'centre': centre[i], 'members': [i]})
+    return [i for line in lines for i in sorted(line['members'], key=lambda j: start[j])]
+
+
+def tiled_ocr(image, tile_size=1024, overlap=128, scale='auto', workers=None, ocr_kwargs=None, row_overlap=0.5):
+    """
+    OCR a large BGR image tile by tile across a process pool.
+
+    Each worker keeps its own OCR model and only ever holds one upscaled tile,
+    so peak memory is bounded by tile_size * scale rather than the full image.
+    At most two tiles per worker are in flight at a time.
+    """
+    workers = workers or os.cpu_count() or 1
+    ocr_kwargs = ocr_kwargs or {'lang': 'japan', 'use_angle_cls': True, 'show_log': False}
+    tiles = split_tiles(image.shape[0], image.shape[1], tile_size, overlap)
+    print(f"Processing {len(tiles)} tiles of up to {tile_size}px on {workers} workers...")
+
+    texts, confidences, boxes, sources = [], [], [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(ocr_kwargs, worker_cpu_threads(workers))) as pool:
+        pending = {}
+        queued = enumerate(tiles)
+        while True:
+            for index, (x, y, w, h) in queued:
+                tile = np.ascontiguousarray(image[y:y + h, x:x + w])
+                pending[pool.submit(_ocr_tile, tile, x, y, scale)] = index
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                tile_texts, tile_confidences, tile_boxes = future.result()
+                texts.extend(tile_texts)
+                confidences.extend(tile_confidences)
+                boxes.extend(tile_boxes)
+                sources.extend([index] * len(tile_texts))
+
+    if not boxes:
+        return OCRResult([])
+
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4, 2)
+    boxes, texts, confidences = merge_fragments(boxes, texts, confidences, row_overlap, sources)
+    order = reading_order(boxes)
+    lines = [OCRLine(texts[i], confidences[i], new_index) for new_index, i in enumerate(order)]
+    return OCRResult(lines, boxes[order])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR a large image in parallel, overlapping tiles.')
+    parser.add_argument('image_path', type=str, help='Path to the image to process.')
+    parser.add_argument('-o', '--output', type=str, help='Path to save the extracted text. If not provided, text will be printed to the console.')
+    parser.add_argument('--tile_size', type=int, default=1024, help='Tile edge length in original image pixels.')
+    parser.add_argument('--overlap', type=int, default=128, help='Minimum overlap between neighbouring tiles in pixels; should exceed the largest character, so each character is whole in at least one tile.')
+    parser.add_argument('--scale', type=parse_scale, default='auto', help="Resize factor applied to each tile before OCR, or 'auto' to pick it per tile.")
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (defaults to the CPU count).')
+    parser.add_argument('--use_gpu', action='store_true', help='Use GPU for OCR (requires compatible GPU and proper setup).')
+
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image_path)
+    if image is None:
+        print(f"Error: Unable to load image at {args.image_path}")
+        sys.exit(1)
+
+    ocr_kwargs = {'lang': 'japan', 'use_angle_cls': True, 'use_gpu': args.use_gpu, 'show_log': False}
+    result = tiled_ocr(image, args.tile_size, args.overlap, args.scale, args.workers, ocr_kwargs)
+
+    if args.output:
+        save_extracted_text(result.text, args.output)
+    else:
+        print("\n--- Extracted Text ---\n")
+        print(result.text)
+        print("\n----------------------\n")
+
+
+if __name__ == '__main__':
+    main()
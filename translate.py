@@ -8,7 +8,18 @@ import matplotlib.pyplot as plt
 import os
 import pytesseract
 
-def preprocess_image(image_path, scale=3.0):  # Increase scale to make text bigger
+from ocr_results import parse_paddleocr_results
+
+# Text height (as measured by estimate_text_height) to scale to before OCR, per engine.
+# PaddleOCR's recognizer works on 48px-high line crops; Tesseract reads best with
+# glyphs around 30px high and gains nothing from larger ones.
+TARGET_TEXT_HEIGHTS = {'paddle': 48, 'tesseract': 32}
+DEFAULT_TARGET_TEXT_HEIGHT = TARGET_TEXT_HEIGHTS['paddle']
+
+# Last scale chosen by resolve_scale per engine, so per-frame calls only log changes
+_last_auto_scale = {}
+
+def preprocess_image(image_path, scale='auto'):  # 'auto' picks the scale from the text height
     """
     Preprocess the image to enhance OCR accuracy.
     """
@@ -19,8 +30,23 @@ def preprocess_image(image_path, scale=3.0):  # Increase scale to make text bigg
         print(f"Error: Unable to load image at {image_path}")
         sys.exit(1)
 
-    # Resize the image to make text more readable
-    image = resize_image(image, scale=scale)
+    processed = preprocess_frame(image, scale=scale)
+
+    # Save the processed image for debugging
+    processed_image_path = 'processed_image.png'
+    cv2.imwrite(processed_image_path, processed)
+    print(f"Processed image saved to {processed_image_path}")
+
+    return processed
+
+
+def preprocess_frame(image, scale='auto', apply_deskew=True, engine='paddle'):
+    """
+    Preprocess an in-memory BGR image (a loaded file, a screen capture or a tile)
+    for the given OCR engine.
+    """
+    # Resize the image so text reaches the engine's preferred height
+    image = resize_image(image, scale=resolve_scale(image, scale, engine))
 
     # Convert to grayscale
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -29,7 +55,10 @@ def preprocess_image(image_path, scale=3.0):  # Increase scale to make text bigg
     gray = enhance_contrast(gray)
 
     # Deskew the image
-    deskewed = deskew(image)
+    if apply_deskew:
+        deskewed = deskew(image)
+    else:
+        deskewed = image
     gray_deskewed = cv2.cvtColor(deskewed, cv2.COLOR_BGR2GRAY)
 
     # Apply adaptive thresholding with adjusted parameters
@@ -44,11 +73,6 @@ def preprocess_image(image_path, scale=3.0):  # Increase scale to make text bigg
     kernel = np.ones((2, 2), np.uint8)  # Smaller kernel size
     processed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel, iterations=1)
 
-    # Save the processed image for debugging
-    processed_image_path = 'processed_image.png'
-    cv2.imwrite(processed_image_path, processed)
-    print(f"Processed image saved to {processed_image_path}")
-
     return processed
 
 
@@ -57,11 +81,101 @@ def resize_image(image, scale=2.0):
     """
     Resize the image by the given scale factor.
     """
+    if scale == 1.0:
+        return image
     width = int(image.shape[1] * scale)
     height = int(image.shape[0] * scale)
-    resized = cv2.resize(image, (width, height), interpolation=cv2.INTER_LINEAR)
+    # INTER_AREA avoids aliasing when shrinking
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+    resized = cv2.resize(image, (width, height), interpolation=interpolation)
     return resized
 
+def _text_height_at(gray, factor, min_components):
+    """
+    Area-weighted median height of glyph-like components of gray resized by factor.
+    """
+    if factor < 1.0:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+
+    # Edges of glyphs (either polarity), closed so each glyph becomes one blob
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+
+    # Drop specks, long rules/borders and blobs spanning most of the frame
+    glyphs = (
+        (heights >= 4) & (areas >= 10)
+        & (widths <= heights * 3) & (heights <= widths * 3)
+        & (heights < gray.shape[0] * 0.8)
+    )
+    if np.count_nonzero(glyphs) < min_components:
+        return None
+
+    # Weight by area so that noise specks do not outvote real glyphs
+    order = np.argsort(heights[glyphs])
+    sorted_heights = heights[glyphs][order]
+    cumulative = np.cumsum(areas[glyphs][order])
+    median = sorted_heights[np.searchsorted(cumulative, cumulative[-1] / 2)]
+    return float(median) / factor
+
+def estimate_text_height(image, max_side=800, min_components=3):
+    """
+    Estimate the dominant text height in pixels from connected components on a
+    downsampled copy of the image. Returns None if no text-like components are found.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    factor = min(1.0, max_side / max(gray.shape[:2]))
+
+    # Very large glyphs fall apart into strokes or merge with each other, so retry
+    # at coarser resolutions until components are found
+    while min(gray.shape[:2]) * factor >= 24:
+        height = _text_height_at(gray, factor, min_components)
+        if height is not None:
+            return height
+        factor /= 2
+    return None
+
+def choose_scale(image, target_height=DEFAULT_TARGET_TEXT_HEIGHT, min_scale=0.5, max_scale=4.0, fallback=2.0):
+    """
+    Pick the resize factor that brings the dominant text height to target_height.
+    Large text is downscaled; the fallback is used when no text height can be estimated.
+    """
+    text_height = estimate_text_height(image)
+    if text_height is None:
+        return fallback
+    scale = min(max(target_height / text_height, min_scale), max_scale)
+    # Snap to quarter steps so small estimate jitter does not change the scale every frame
+    return max(round(scale * 4) / 4, min_scale)
+
+def resolve_scale(image, scale, engine='paddle'):
+    """
+    Turn a scale argument (a number or 'auto') into a resize factor for this
+    image; 'auto' targets the text height the OCR engine reads best.
+    """
+    if scale == 'auto':
+        scale = choose_scale(image, TARGET_TEXT_HEIGHTS.get(engine, DEFAULT_TARGET_TEXT_HEIGHT))
+        if _last_auto_scale.get(engine) != scale:
+            _last_auto_scale[engine] = scale
+            print(f"Auto scale: {scale:.2f}")
+        return scale
+    return float(scale)
+
+def parse_scale(text):
+    """
+    argparse type for --scale: a number or 'auto'.
+    """
+    if text == 'auto':
+        return text
+    try:
+        return float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid scale '{text}', expected a number or 'auto'")
+
 def enhance_contrast(gray_image):
     """
     Enhance the contrast of the grayscale image using CLAHE.
@@ -73,8 +187,9 @@ def enhance_contrast(gray_image):
 def deskew(image, max_angle=15.0):
     """
     Corrects the skew of an image, limiting the maximum deskew angle.
+    Accepts BGR or grayscale images.
     """
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     coords = np.column_stack(np.where(gray > 0))
     if coords.size == 0:
         print("Warning: No text detected for deskewing.")
@@ -99,6 +214,7 @@ def deskew(image, max_angle=15.0):
 def perform_paddleocr(processed_image, ocr_model):
     """
     Perform OCR on the preprocessed image using PaddleOCR.
+    Returns all recognised lines joined by newlines.
     """
     # Convert the processed OpenCV image to RGB format
     rgb_image = cv2.cvtColor(processed_image, cv2.COLOR_GRAY2RGB)
@@ -106,38 +222,13 @@ def perform_paddleocr(processed_image, ocr_model):
     # Perform OCR
     results = ocr_model.ocr(rgb_image, rec=True, cls=True)
 
-    # Print the complete structure of results for debugging
-    print("OCR Results Structure:")
-    for result in results:
-        print(result)
-
-    # Initialize extracted_text as an empty string to accumulate results from each line
-    extracted_text = ""
-
-    # Loop through each detected line
-    for idx, line in enumerate(results):
-        print(f"\nProcessing Line {idx + 1}: {line}")
-
-        # Check if the line has the nested structure we expect
-        if len(line) > 0 and isinstance(line[0], list) and len(line[0]) >= 2:
-            bounding_box, text_conf = line[0]  # Access the bounding box and text-confidence tuple
-
-            # Extract the text and confidence if they are in the correct format
-            if isinstance(text_conf, tuple) and len(text_conf) == 2:
-                text = text_conf[0]
-                confidence = text_conf[1]
-
-                # Print for debugging
-                print(f"Extracted Text: {text}, Confidence: {confidence}")
+    # Convert the nested result lists into line records
+    result = parse_paddleocr_results(results)
 
-                # Append each line to extracted_text with a newline character
-                extracted_text += text + '\n'
-            else:
-                print(f"Unexpected text-confidence structure for line {idx + 1}: {text_conf}")
-        else:
-            print(f"Unexpected structure for line {idx + 1}: {line}")
+    for idx, line in enumerate(result.lines):
+        print(f"Line {idx + 1}: {line.text}, Confidence: {line.confidence}")
 
-    return extracted_text.strip()  # Return all extracted text as a single string
+    return result.text
 
 
 def perform_tesseract_ocr(processed_image):
@@ -167,9 +258,10 @@ def visualize_ocr_results(original_image_path, processed_image, ocr_model, outpu
     image = Image.open(original_image_path).convert('RGB')
 
     # Draw OCR results
-    boxes = [line[0] for line in result]
-    txts = [line[1][0] for line in result]
-    scores = [line[1][1] for line in result]
+    result = parse_paddleocr_results(result)
+    boxes = [result.box(line) for line in result.lines]
+    txts = [line.text for line in result.lines]
+    scores = [line.confidence for line in result.lines]
     image_with_boxes = draw_ocr(image, boxes, txts, scores, font_path=font_path)
     image_with_boxes = Image.fromarray(image_with_boxes)
 
@@ -197,6 +289,7 @@ def main():
     parser.add_argument('--use_gpu', action='store_true', help='Use GPU for OCR (requires compatible GPU and proper setup).')
     parser.add_argument('--tesseract', action='store_true', help='Use Tesseract OCR in addition to PaddleOCR.')
     parser.add_argument('--font_path', type=str, help='Path to a Japanese-supporting .ttf or .ttc font for visualization.')
+    parser.add_argument('--scale', type=parse_scale, default='auto', help="Resize factor before OCR, or 'auto' to pick it from the text height.")
 
     args = parser.parse_args()
 
@@ -211,7 +304,7 @@ def main():
 
     # Preprocess the image
     print("Preprocessing the image...")
-    processed_image = preprocess_image('screenshot.png', scale=2.0)
+    processed_image = preprocess_image('screenshot.png', scale=args.scale)
 
     # Perform PaddleOCR
     print("Performing PaddleOCR...")
@@ -0,0 +1,223 @@
+import collections
+import difflib
+import heapq
+import itertools
+import threading
+import time
+
+# Request priorities; lower runs first
+PRIORITY_VISIBLE = 0
+PRIORITY_PREFETCH = 1
+
+
+class _Request:
+    __slots__ = ('text', 'priority', 'submitted', 'context', 'cancelled')
+
+    def __init__(self, text, priority, context):
+        self.text = text
+        self.priority = priority
+        self.submitted = time.monotonic()
+        self.context = context
+        self.cancelled = False
+
+
+class TranslationQueue:
+    """
+    Prioritized, cancellable translation queue served by background threads.
+
+    submit() marks its text as the one currently on screen: it jumps ahead of
+    everything else (newest first) and cancels pending requests for text that
+    is no longer visible. Background prefetch() requests are only accepted
+    while the queue is idle and run on a separate thread, so a prefetch in
+    progress never delays visible text. Finished translations
+    are kept in an LRU cache, so repeated or prefetched lines are returned
+    directly by submit().
+
+    on_result(text, translation, context) is called from a worker thread for
+    requests whose text is still visible when the translation arrives;
+    translations of obsolete text only go to the cache. It is never called
+    from submit() itself.
+    """
+
+    def __init__(self, translator, on_result, workers=1, cache_size=512):
+        self.translator = translator
+        self.on_result = on_result
+        self.cache_size = cache_size
+
+        self._cache = collections.OrderedDict()
+        self._heap = []
+        self._prefetches = collections.deque()
+        self._pending = {}
+        self._in_flight = set()
+        self._visible = set()
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self.latencies = collections.deque(maxlen=1000)
+        self.cancelled = 0
+
+        self._threads = [
+            threading.Thread(target=self._worker, args=(False,), name=f'translation-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        self._threads.append(threading.Thread(target=self._worker, args=(True,), name='translation-prefetch', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, text, context=None):
+        """
+        Request a translation of the text now on screen. Returns the cached
+        translation if there is one; otherwise returns None and on_result
+        delivers the translation later.
+        """
+        with self._condition:
+            self._set_visible_locked({text})
+            cached = self._cache_get(text)
+            if cached is not None:
+                self.latencies.append(0.0)
+                return cached
+            request = self._pending.get(text)
+            if request is not None and request.priority == PRIORITY_VISIBLE:
+                request.context = context
+            elif text in self._in_flight:
+                # Wait for the translation already running instead of starting another
+                self._pending[text] = _Request(text, PRIORITY_VISIBLE, context)
+            else:
+                if request is not None:
+                    # Queued as a prefetch: promote it
+                    request.cancelled = True
+                self._push(_Request(text, PRIORITY_VISIBLE, context))
+            return None
+
+    def set_visible(self, texts):
+        """
+        Declare which texts are on screen; pending requests for anything else are cancelled.
+        """
+        with self._condition:
+            self._set_visible_locked(set(texts))
+
+    def prefetch(self, texts):
+        """
+        Translate likely-upcoming lines in the background. Ignored unless the
+        queue is idle. Returns the number of lines queued.
+        """
+        with self._condition:
+            if not self._idle_locked():
+                return 0
+            queued = 0
+            for text in texts:
+                if text and text not in self._cache and text not in self._pending:
+                    self._push(_Request(text, PRIORITY_PREFETCH, None))
+                    queued += 1
+            return queued
+
+    def idle(self):
+        """
+        True when nothing is queued or being translated.
+        """
+        with self._condition:
+            return self._idle_locked()
+
+    def _idle_locked(self):
+        return not self._pending and not self._in_flight
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _set_visible_locked(self, texts):
+        self._visible = texts
+        for text, request in list(self._pending.items()):
+            if request.priority == PRIORITY_VISIBLE and text not in texts:
+                request.cancelled = True
+                del self._pending[text]
+                self.cancelled += 1
+
+    def _push(self, request):
+        # Visible requests run newest first, prefetches in the order given
+        if request.priority == PRIORITY_VISIBLE:
+            heapq.heappush(self._heap, (-next(self._counter), request))
+        else:
+            self._prefetches.append(request)
+        self._pending[request.text] = request
+        self._condition.notify_all()
+
+    def _cache_get(self, text):
+        if text in self._cache:
+            self._cache.move_to_end(text)
+            return self._cache[text]
+        return None
+
+    def _cache_put(self, text, translation):
+        self._cache[text] = translation
+        self._cache.move_to_end(text)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _next_request(self, prefetch):
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                while self._prefetches if prefetch else self._heap:
+                    request = self._prefetches.popleft() if prefetch else heapq.heappop(self._heap)[1]
+                    if request.cancelled:
+                        continue
+                    if self._pending.get(request.text) is request:
+                        del self._pending[request.text]
+                    self._in_flight.add(request.text)
+                    return request
+                self._condition.wait()
+
+    def _worker(self, prefetch):
+        while True:
+            request = self._next_request(prefetch)
+            if request is None:
+                return
+            try:
+                translation = self.translator.translate(request.text)
+            except Exception as e:
+                print(f"Error translating text: {e}")
+                translation = None
+
+            with self._condition:
+                self._in_flight.discard(request.text)
+                if translation is not None:
+                    self._cache_put(request.text, translation)
+                deliver = (
+                    translation is not None
+                    and request.priority == PRIORITY_VISIBLE
+                    and request.text in self._visible
+                )
+                # A visible request may have been waiting on this in-flight translation
+                # (it is never in the heap); on failure it is dropped so the text can be resubmitted
+                waiting = self._pending.pop(request.text, None)
+                if waiting is not None and translation is not None and waiting.text in self._visible:
+                    deliver, request = True, waiting
+
+            if deliver:
+                self.latencies.append(time.monotonic() - request.submitted)
+                self.on_result(request.text, translation, request.context)
+
+    def latency_summary(self):
+        """
+        Return (mean, max) seconds from submit() to on_result() over recent requests.
+        """
+        if not self.latencies:
+            return 0.0, 0.0
+        return sum(self.latencies) / len(self.latencies), max(self.latencies)
+
+
+def upcoming_lines(script_lines, text, count=3, cutoff=0.6):
+    """
+    Find the script line closest to the recognised text and return the
+    `count` lines after it, as candidates for prefetch().
+    """
+    match = difflib.get_close_matches(text, script_lines, n=1, cutoff=cutoff)
+    if not match:
+        return []
+    index = script_lines.index(match[0])
+    return script_lines[index + 1:index + 1 + count]
@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class _Client:
+    """
+    One connected subscriber with its own bounded queue of encoded events.
+    """
+
+    def __init__(self, kind, writer, queue_size):
+        self.kind = kind
+        self.writer = writer
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.coalesced = 0
+        self.peer = writer.get_extra_info('peername')
+
+    def offer(self, payload, policy):
+        """
+        Queue a payload without blocking. Returns False if the client should be dropped.
+        """
+        if not self.queue.full():
+            self.queue.put_nowait(payload)
+            return True
+        if policy == 'drop':
+            return False
+        # Coalesce: the oldest pending event is superseded by the newest one
+        self.queue.get_nowait()
+        self.queue.put_nowait(payload)
+        self.coalesced += 1
+        return True
+
+
+class TranslationServer:
+    """
+    Embedded asyncio HTTP server that fans OCR/translation events out to any
+    number of subscribers over Server-Sent Events (/events) or WebSocket (/ws).
+    GET /latest returns the most recent event as JSON.
+
+    The server runs its own event loop in a background thread; publish() may be
+    called from any thread and never blocks. Each event is encoded once and
+    offered to every client's bounded queue. When a queue is full the client's
+    oldest pending event is replaced ('coalesce') or the client is disconnected
+    ('drop'); a client whose socket does not drain within send_timeout is
+    disconnected either way, so slow consumers never stall the pipeline.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, queue_size=8, policy='coalesce', send_timeout=5.0):
+        if policy not in ('coalesce', 'drop'):
+            raise ValueError("policy must be 'coalesce' or 'drop'")
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+
+        self._clients = set()
+        self._latest = None
+        self._seq = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._start_error = None
+
+    # Public API (any thread)
+
+    def start(self):
+        """
+        Start serving in a background thread. Raises OSError if the server
+        cannot listen (e.g. the port is already in use).
+        """
+        self._thread = threading.Thread(target=self._run, name='translation-server', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            self._thread.join()
+            raise self._start_error
+        print(f"Translation server listening on http://{self.host}:{self.port}/ (SSE /events, WebSocket /ws)")
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+    def publish(self, text, translation=None, **extra):
+        """
+        Publish one OCR/translation event to all subscribers.
+        """
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._broadcast, text, translation, extra)
+
+    def client_count(self):
+        return len(self._clients)
+
+    # Event loop side
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        except OSError as e:
+            self._start_error = e
+            loop.close()
+            self._started.set()
+            return
+        self._loop = loop
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            for client in list(self._clients):
+                client.writer.close()
+            # Let connection handlers unwind before the loop goes away
+            tasks = [task for task in asyncio.all_tasks(loop) if not task.done()]
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(self._server.wait_closed())
+            loop.close()
+
+    def _broadcast(self, text, translation, extra):
+        self._seq += 1
+        event = {'seq': self._seq, 'timestamp': time.time(), 'text': text, 'translation': translation}
+        event.update(extra)
+        # Encode once, shared by every subscriber
+        self._latest = json.dumps(event, ensure_ascii=False).encode('utf-8')
+        for client in list(self._clients):
+            if not client.offer(self._latest, self.policy):
+                print(f"Dropping slow subscriber {client.peer}")
+                self._disconnect(client)
+
+    def _disconnect(self, client):
+        if client not in self._clients:
+            return
+        self._clients.discard(client)
+        client.writer.close()
+        # Wake the client's pump with a sentinel in case it is waiting on the queue
+        while client.queue.full():
+            client.queue.get_nowait()
+        client.queue.put_nowait(None)
+
+    async def _handle(self, reader, writer):
+        try:
+            await self._serve(reader, writer)
+        except asyncio.CancelledError:
+            # Shutdown; ending normally keeps asyncio's connection callback from logging the cancellation
+            writer.close()
+
+    async def _serve(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+
+        parts = request_line.decode('latin-1').split()
+        path = parts[1] if len(parts) >= 2 else '/'
+
+        if path == '/events':
+            await self._serve_sse(writer)
+        elif path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+            await self._serve_websocket(reader, writer, headers)
+        elif path == '/latest':
+            body = self._latest or b'{}'
+            await self._respond(writer, '200 OK', 'application/json; charset=utf-8', body)
+        else:
+            await self._respond(writer, '404 Not Found', 'text/plain', b'Try /events, /ws or /latest\n')
+
+    async def _respond(self, writer, status, content_type, body):
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _pump(self, client, encode):
+        """
+        Send queued events to one client until it disconnects or falls too far behind.
+        """
+        self._clients.add(client)
+        if self._latest is not None:
+            client.offer(self._latest, self.policy)
+        try:
+            while True:
+                payload = await client.queue.get()
+                if payload is None:
+                    break
+                client.writer.write(encode(payload))
+                await asyncio.wait_for(client.writer.drain(), self.send_timeout)
+        except asyncio.TimeoutError:
+            print(f"Subscriber {client.peer} did not drain within {self.send_timeout}s, disconnecting")
+        except ConnectionError:
+            pass
+        finally:
+            self._disconnect(client)
+
+    async def _serve_sse(self, writer):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+            b"Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n"
+        )
+        await self._pump(_Client('sse', writer, self.queue_size), lambda payload: b'data: ' + payload + b'\n\n')
+
+    async def _serve_websocket(self, reader, writer, headers):
+        key = headers.get('sec-websocket-key')
+        if not key:
+            await self._respond(writer, '400 Bad Request', 'text/plain', b'Missing Sec-WebSocket-Key\n')
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode('latin-1')
+        )
+        client = _Client('ws', writer, self.queue_size)
+        # Subscribers only listen; read frames just to notice a close
+        watcher = asyncio.ensure_future(self._watch_websocket(reader, client))
+        try:
+            await self._pump(client, _websocket_frame)
+        finally:
+            watcher.cancel()
+
+    async def _watch_websocket(self, reader, client):
+        try:
+            while True:
+                header = await reader.readexactly(2)
+                opcode = header[0] & 0x0F
+                length = header[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack('!H', await reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack('!Q', await reader.readexactly(8))[0]
+                if header[1] & 0x80:
+                    await reader.readexactly(4)
+                await reader.readexactly(length)
+                if opcode == 0x8:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        self._disconnect(client)
+
+
+def _websocket_frame(payload):
+    """
+    Encode a payload as a single unmasked WebSocket text frame.
+    """
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x81, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x81, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x81, 127, length)
+    return header + payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the translation fan-out server and publish a test event every second.')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to listen on.')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on.')
+    parser.add_argument('--policy', choices=['coalesce', 'drop'], default='coalesce', help='What to do with subscribers whose queue is full.')
+
+    args = parser.parse_args()
+
+    server = TranslationServer(args.host, args.port, policy=args.policy).start()
+    try:
+        count = 0
+        while True:
+            count += 1
+            server.publish(f"テスト {count}", f"Test {count}")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()